@@ -5,7 +5,8 @@ from django.contrib.auth.decorators import login_required
 from django.contrib.auth.forms import PasswordChangeForm
 from .forms import EditProfileForm, ProfileForm
 from .models import Profile # Importer le modèle Profile
-from products_app.models import Product, Cart
+from products_app.models import Product
+from products_app.cart import get_cart_store
 
 User = get_user_model()
 
@@ -144,8 +145,7 @@ def home(request):
 @login_required
 def add_to_cart(request, product_id):
     product = get_object_or_404(Product, id=product_id)
-    cart, created = Cart.objects.get_or_create(user=request.user)
-    cart.products.add(product)
+    get_cart_store(request).add(product.id)
     messages.success(request, f"{product.name} a été ajouté au panier ✅")
     return redirect('products_app:home')
 
@@ -153,7 +153,5 @@ def add_to_cart(request, product_id):
 @login_required
 def buy_now(request, product_id):
     product = get_object_or_404(Product, id=product_id)
-    cart, _ = Cart.objects.get_or_create(user=request.user)
-    cart.products.add(product)
-    cart.save()
+    get_cart_store(request).add(product.id)
     return redirect('products_app:checkout')
\ No newline at end of file
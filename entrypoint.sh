@@ -13,6 +13,13 @@ echo "-> Exécution des migrations de la base de données..."
 python manage.py migrate --noinput
 
 # 3. Lancer le serveur Gunicorn
-echo "-> Lancement du serveur Gunicorn..."
+# SERVER_MODE=asgi : workers Uvicorn (vues async de recherche/géo servies sans thread)
+# SERVER_MODE=wsgi (défaut) : workers synchrones classiques
+SERVER_MODE="${SERVER_MODE:-wsgi}"
+echo "-> Lancement du serveur Gunicorn (mode ${SERVER_MODE})..."
 # La commande Gunicorn doit être la dernière
-exec gunicorn myshop.wsgi:application
\ No newline at end of file
+if [ "$SERVER_MODE" = "asgi" ]; then
+    exec gunicorn myshop.asgi:application -k uvicorn.workers.UvicornWorker
+else
+    exec gunicorn myshop.wsgi:application
+fi
@@ -0,0 +1,128 @@
+"""
+Routage base principale / réplique en lecture.
+
+Les lectures du catalogue et de la géographie (`Product`, `ProductImage`,
+`ProductNeighbor`, `Wilaya`, `Daira`, `Commune`) partent sur l'alias "replica" quand il est
+configuré (`DB_REPLICA_NAME` / `DB_REPLICA_HOST`). Tout le reste — commandes,
+paniers, sessions, comptes — et toutes les écritures restent sur "default".
+
+Pour ne pas relire une donnée périmée juste après l'avoir écrite, les
+lectures repassent sur la base principale :
+- dans une transaction ouverte sur la base principale ;
+- pour le reste de la requête HTTP (ou de la commande de gestion) dès
+  qu'une écriture a eu lieu, ou quand la vue l'a demandé avec
+  `pin_to_primary()` avant de lire ce qu'elle va écrire (validation de
+  commande) — `PrimaryPinningMiddleware` remet à zéro.
+
+Connexions persistantes (`CONN_MAX_AGE`) : avec `CONN_HEALTH_CHECKS`, une
+connexion réutilisée est testée au début de chaque requête et fermée si la
+base l'a coupée (redémarrage, délai d'inactivité), au lieu de faire échouer la
+requête. Django le fait lui-même à partir de 4.1 ; `check_persistent_connections`
+n'est branché que sur les versions antérieures.
+"""
+
+from contextvars import ContextVar
+
+import django
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.signals import request_started
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+REPLICA_DB_ALIAS = 'replica'
+
+REPLICA_MODELS = {
+    ('products_app', 'product'),
+    ('products_app', 'productimage'),
+    ('products_app', 'productneighbor'),
+    ('products_app', 'wilaya'),
+    ('products_app', 'daira'),
+    ('products_app', 'commune'),
+}
+
+_pinned = ContextVar('db_pinned_to_primary', default=False)
+
+
+def pin_to_primary():
+    """Lit sur la base principale pour le reste de la requête (prix et stock avant une écriture)."""
+    _pinned.set(True)
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if REPLICA_DB_ALIAS not in settings.DATABASES:
+            return None
+        if (model._meta.app_label, model._meta.model_name) not in REPLICA_MODELS:
+            return DEFAULT_DB_ALIAS
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db:
+            return instance._state.db
+        if _pinned.get() or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return REPLICA_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        _pinned.set(True)
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # La réplique contient les mêmes lignes : les relations entre alias sont valides
+        databases = {DEFAULT_DB_ALIAS, REPLICA_DB_ALIAS}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+
+class PrimaryPinningMiddleware:
+    """Chaque requête repart des lectures sur la réplique."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        token = _pinned.set(False)
+        try:
+            return self.get_response(request)
+        finally:
+            _pinned.reset(token)
+
+    async def __acall__(self, request):
+        # sync_to_async recopie le contexte : un épinglage posé par une vue synchrone remonte ici
+        token = _pinned.set(False)
+        try:
+            return await self.get_response(request)
+        finally:
+            _pinned.reset(token)
+
+
+def check_persistent_connections(**kwargs):
+    """Ferme les connexions persistantes ouvertes qui ne répondent plus (`CONN_HEALTH_CHECKS`)."""
+    for connection in connections.all():
+        if (
+            connection.connection is None
+            or connection.in_atomic_block
+            or not connection.settings_dict.get('CONN_HEALTH_CHECKS')
+            or not connection.settings_dict.get('CONN_MAX_AGE')
+        ):
+            continue
+        try:
+            usable = connection.is_usable()
+        except NotImplementedError:
+            # Moteur sans test de connexion (djongo) : rien à vérifier
+            continue
+        except DatabaseError:
+            usable = False
+        if not usable:
+            connection.close()
+
+
+if django.VERSION < (4, 1):
+    request_started.connect(check_persistent_connections, dispatch_uid='check_persistent_connections')
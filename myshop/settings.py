@@ -49,6 +49,8 @@ INSTALLED_APPS = [
 # Middleware
 # --------------------------
 MIDDLEWARE = [
+    'products_app.metrics.MetricsMiddleware',  # en premier : mesure toute la chaîne
+    'myshop.routers.PrimaryPinningMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -56,6 +58,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'products_app.cart.CartStoreMiddleware',
 ]
 
 # --------------------------
@@ -88,18 +91,84 @@ TEMPLATES = [
 WSGI_APPLICATION = 'myshop.wsgi.application'
 
 # --------------------------
-# Base de données (MongoDB via Djongo)
+# Base de données (MongoDB via Djongo par défaut ; tout moteur Django via DB_ENGINE)
 # --------------------------
-DATABASES = {
-    'default': {
-        'ENGINE': 'djongo',
-        'NAME': 'store',
-        'CLIENT': {
-            'host': config('MONGO_URI'),  # >>> lus depuis l'environnement
+DB_ENGINE = config('DB_ENGINE', default='djongo')
+
+if DB_ENGINE == 'djongo':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'djongo',
+            'NAME': config('DB_NAME', default='store'),
+            'CLIENT': {
+                'host': config('MONGO_URI'),  # >>> lus depuis l'environnement
+            }
         }
     }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': DB_ENGINE,
+            'NAME': config('DB_NAME', default=str(BASE_DIR / 'db.sqlite3')),
+            'USER': config('DB_USER', default=''),
+            'PASSWORD': config('DB_PASSWORD', default=''),
+            'HOST': config('DB_HOST', default=''),
+            'PORT': config('DB_PORT', default=''),
+        }
+    }
+
+# Connexions persistantes : réutilisées d'une requête à l'autre, vérifiées avant
+# réutilisation (CONN_HEALTH_CHECKS : natif depuis Django 4.1, sinon myshop/routers.py).
+# En mode ASGI (entrypoint.sh) chaque requête peut tourner dans un autre thread :
+# on revient à une connexion par requête.
+DATABASES['default'].update({
+    'CONN_MAX_AGE': config('DB_CONN_MAX_AGE', default=0 if config('SERVER_MODE', default='wsgi') == 'asgi' else 60, cast=int),
+    'CONN_HEALTH_CHECKS': config('DB_CONN_HEALTH_CHECKS', default=True, cast=bool),
+})
+
+# Réplique en lecture (optionnelle) : catalogue et géographie y sont lus,
+# voir myshop/routers.py. Mêmes réglages que la base principale sauf le nom/hôte.
+DB_REPLICA_NAME = config('DB_REPLICA_NAME', default='')
+DB_REPLICA_HOST = config('DB_REPLICA_HOST', default='')
+if DB_REPLICA_NAME or DB_REPLICA_HOST:
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'TEST': {'MIRROR': 'default'},  # en test, la réplique est la base principale
+    }
+    if DB_REPLICA_NAME:
+        DATABASES['replica']['NAME'] = DB_REPLICA_NAME
+    if DB_REPLICA_HOST:
+        if DB_ENGINE == 'djongo':
+            DATABASES['replica']['CLIENT'] = {'host': DB_REPLICA_HOST}
+        else:
+            DATABASES['replica']['HOST'] = DB_REPLICA_HOST
+
+DATABASE_ROUTERS = ['myshop.routers.PrimaryReplicaRouter']
+
+# --------------------------
+# Cache (partagé entre les workers Gunicorn : fichiers locaux par défaut)
+# --------------------------
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': config('CACHE_LOCATION', default=str(BASE_DIR / '.cache')),
+    }
 }
 
+# --------------------------
+# Panier : "session", "cache" (une clé par ligne, incréments atomiques : Redis ou Memcached
+# uniquement, refusé au démarrage sinon) ou "cookie" (cookie signé)
+# --------------------------
+CART_STORE = config('CART_STORE', default='session')
+
+# --------------------------
+# Métriques (/metrics) : fichier SQLite local partagé par les workers Gunicorn
+# --------------------------
+METRICS_DB_PATH = config('METRICS_DB_PATH', default=str(BASE_DIR / '.metrics.sqlite3'))
+METRICS_FLUSH_INTERVAL = config('METRICS_FLUSH_INTERVAL', default=1.0, cast=float)  # secondes
+METRICS_SLOW_QUERY_MS = config('METRICS_SLOW_QUERY_MS', default=100, cast=int)
+METRICS_SLOW_REQUEST_MS = config('METRICS_SLOW_REQUEST_MS', default=1000, cast=int)
+
 # --------------------------
 # Validation des mots de passe
 # --------------------------
@@ -0,0 +1,31 @@
+"""
+Réglages du banc de performance (`manage.py benchmark`).
+
+Reprend les réglages de production mais remplace MongoDB par un fichier
+SQLite jetable, recréé à chaque exécution du banc.
+"""
+
+import os
+
+os.environ.setdefault('MONGO_URI', 'mongodb://localhost')  # non utilisé : la base du banc est SQLite
+
+from .settings import *  # noqa: E402,F401,F403
+from .settings import BASE_DIR, config  # noqa: E402
+
+DEBUG = False
+ALLOWED_HOSTS = ['testserver', '127.0.0.1', 'localhost']
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': config('BENCH_DB_PATH', default=str(BASE_DIR / '.bench.sqlite3')),
+        'OPTIONS': {'timeout': 30},
+    }
+}
+
+# Cache propre au processus : aucune page d'une exécution précédente n'est relue
+CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'bench'},
+}
+
+METRICS_DB_PATH = None
@@ -5,6 +5,9 @@ from django.conf import settings
 from django.conf.urls.static import static
 
 urlpatterns = [
+    # Les pages staff de products_app (admin/orders/, admin/export_orders_csv/) doivent être
+    # résolues avant l'admin Django, dont la vue "catch-all" renverrait une 404.
+    path('', include('products_app.urls', namespace='products_app')),
     path('admin/', admin.site.urls),
     
     # CORRECTION IMPORTANTE : Nous incluons les URLs d'authentification par défaut de Django.
@@ -16,8 +19,6 @@ urlpatterns = [
     # Elle contient probablement votre vue d'inscription (register) et éventuellement login/logout
     # personnalisés. Assurez-vous qu'elle utilise le namespace 'accounts' si nécessaire.
     path('accounts/', include('accounts.urls', namespace='accounts')),
-    
-    path('', include('products_app.urls', namespace='products_app')),
 ]
 
 if settings.DEBUG:
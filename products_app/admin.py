@@ -1,9 +1,11 @@
 from django.contrib import admin
 from django.utils.html import format_html
-from django.http import HttpResponse
+from django.db.models import OuterRef, Subquery
 from decimal import Decimal
-import csv
+from .cache import bump_catalog_version
+from .exports import stream_orders_csv
 from .models import Product, ProductImage, Order, OrderItem, Wilaya, Daira, Commune
+from .search import product_index
 
 # -------------------------
 # Inline pour ProductImage
@@ -23,12 +25,7 @@ class ProductImageInline(admin.TabularInline):
             )
         return "-"
     preview.short_description = "Aperçu"
-
-    # S'assurer qu'une seule image principale
-    def save_model(self, request, obj, form, change):
-        if obj.is_main:
-            ProductImage.objects.filter(product=obj.product).exclude(pk=obj.pk).update(is_main=False)
-        super().save_model(request, obj, form, change)
+    # L'unicité de l'image principale est gérée par ProductImage.save()
 
 
 # -------------------------
@@ -41,6 +38,10 @@ class ProductAdmin(admin.ModelAdmin):
     list_per_page = 30
     inlines = [ProductImageInline]
     actions = ['make_inactive', 'make_active']
+    list_select_related = ('main_image',)
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).prefetch_related('images')
 
     def formatted_price(self, obj):
         try:
@@ -51,7 +52,7 @@ class ProductAdmin(admin.ModelAdmin):
 
     # Miniature image principale
     def thumbnail(self, obj):
-        main_image = obj.images.filter(is_main=True).first()
+        main_image = obj.main_image
         if main_image:
             return format_html(
                 '<img src="{}" style="width:48px; height:48px; object-fit:cover; border-radius:6px;" />',
@@ -73,12 +74,19 @@ class ProductAdmin(admin.ModelAdmin):
     images_preview.short_description = "Toutes les images"
 
     def make_inactive(self, request, queryset):
+        ids = list(queryset.values_list('id', flat=True))
         queryset.update(is_active=False)
+        # update() ne déclenche pas les signaux : cache des pages et index de recherche à la main
+        bump_catalog_version()
+        for product_id in ids:
+            product_index.remove(product_id)
         self.message_user(request, "Produit(s) désactivé(s) avec succès !")
     make_inactive.short_description = "Désactiver les produits sélectionnés"
 
     def make_active(self, request, queryset):
         queryset.update(is_active=True)
+        bump_catalog_version()
+        product_index.mark_stale()
         self.message_user(request, "Produit(s) activé(s) avec succès !")
     make_active.short_description = "Activer les produits sélectionnés"
 
@@ -93,10 +101,13 @@ class OrderItemInline(admin.TabularInline):
     fields = ('product_thumbnail', 'product_link', 'price', 'quantity', 'subtotal_display')
     show_change_link = True
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('product__main_image')
+
     def product_thumbnail(self, obj):
         main_image = None
         if getattr(obj, "product", None):
-            main_image = obj.product.images.filter(is_main=True).first()
+            main_image = obj.product.main_image
         if main_image:
             return format_html(
                 '<img src="{}" style="width:44px; height:44px; object-fit:cover; border-radius:6px;" />',
@@ -132,38 +143,39 @@ class OrderAdmin(admin.ModelAdmin):
     actions = ['export_orders_csv']
     list_per_page = 25
     ordering = ('-created_at',)
-    readonly_fields = ('created_at', 'total_display', 'order_items_summary')
+    readonly_fields = ('created_at', 'total_display', 'items_count', 'order_items_summary')
 
     fieldsets = (
-        ('Informations commande', {'fields': ('user', 'status', 'total_display', 'created_at')}),
+        ('Informations commande', {'fields': ('user', 'status', 'total_display', 'items_count', 'created_at')}),
         ('Détails du client', {'fields': ('full_name', 'email', 'phone')}),
         ('Adresse de livraison', {'fields': ('wilaya', 'daira', 'commune', 'address_details')}),
         ('Récapitulatif des articles (lecture seule)', {'fields': ('order_items_summary',)}),
     )
 
+    # Total et nombre d'articles sont des colonnes de la commande (products_app.orders) ;
+    # l'image du premier article est calculée dans la requête de la liste : le nombre
+    # de requêtes ne dépend pas du nombre de lignes affichées, et le tri reste indexable.
+    def get_queryset(self, request):
+        first_item_image = OrderItem.objects.filter(
+            order=OuterRef('pk')
+        ).order_by('id').values('product__main_image__image')[:1]
+        return super().get_queryset(request).select_related(
+            'user', 'wilaya', 'daira', 'commune'
+        ).annotate(
+            first_item_image=Subquery(first_item_image),
+        )
+
     def total_display(self, obj):
-        total = Decimal('0.00')
-        for item in obj.items.all():
-            try:
-                total += (item.price or Decimal('0.00')) * item.quantity
-            except:
-                continue
-        return f"{total:,.2f} DA"
+        return f"{obj.total:,.2f} DA"
     total_display.short_description = "Montant total"
-
-    def items_count(self, obj):
-        return obj.items.count()
-    items_count.short_description = "Articles"
+    total_display.admin_order_field = 'total'
 
     def first_item_thumb(self, obj):
-        first = obj.items.first()
-        if first and getattr(first.product, 'images', None):
-            main_image = first.product.images.filter(is_main=True).first()
-            if main_image:
-                return format_html(
-                    '<img src="{}" style="width:40px; height:40px; object-fit:cover; border-radius:5px;" />',
-                    main_image.image.url
-                )
+        if obj.first_item_image:
+            return format_html(
+                '<img src="{}" style="width:40px; height:40px; object-fit:cover; border-radius:5px;" />',
+                ProductImage._meta.get_field('image').storage.url(obj.first_item_image)
+            )
         return "-"
     first_item_thumb.short_description = "Aperçu produit"
 
@@ -180,10 +192,10 @@ class OrderAdmin(admin.ModelAdmin):
         if not obj.pk:
             return "-"
         rows = []
-        for item in obj.items.select_related('product').all():
+        for item in obj.items.select_related('product__main_image').all():
             img_html = "-"
-            if getattr(item.product, 'images', None):
-                main_image = item.product.images.filter(is_main=True).first()
+            if item.product:
+                main_image = item.product.main_image
                 if main_image:
                     img_html = format_html(
                         '<img src="{}" style="width:48px;height:48px;object-fit:cover;border-radius:6px;margin-right:8px;" />',
@@ -205,42 +217,7 @@ class OrderAdmin(admin.ModelAdmin):
     order_items_summary.short_description = "Articles de la commande"
 
     def export_orders_csv(self, request, queryset):
-        response = HttpResponse(content_type='text/csv; charset=utf-8')
-        response['Content-Disposition'] = 'attachment; filename="orders_export.csv"'
-        writer = csv.writer(response)
-        writer.writerow([
-            'Order ID', 'Utilisateur', 'Nom complet', 'Email', 'Téléphone',
-            'Statut', 'Montant total (DA)', 'Wilaya', 'Daira', 'Commune', 'Adresse détaillée',
-            'Nb articles', 'Articles détail', 'Date création'
-        ])
-        for order in queryset:
-            total = Decimal('0.00')
-            items_desc = []
-            for item in order.items.select_related('product').all():
-                try:
-                    line_sub = (item.price or Decimal('0.00')) * item.quantity
-                    total += line_sub
-                    pname = item.product.name if item.product else "(produit supprimé)"
-                    items_desc.append(f"{item.quantity}x {pname} @ {item.price:,.2f} DA = {line_sub:,.2f} DA")
-                except:
-                    items_desc.append(f"{item.quantity}x (erreur calcul)")
-            writer.writerow([
-                order.id,
-                order.user.username if order.user else '',
-                order.full_name,
-                order.email,
-                order.phone,
-                order.get_status_display(),
-                f"{total:,.2f}",
-                order.wilaya.name if order.wilaya else '',
-                order.daira.name if order.daira else '',
-                order.commune.name if order.commune else '',
-                order.address_details,
-                order.items.count(),
-                " | ".join(items_desc),
-                order.created_at.strftime("%Y-%m-%d %H:%M:%S")
-            ])
-        return response
+        return stream_orders_csv(queryset)
     export_orders_csv.short_description = "Exporter les commandes sélectionnées (CSV)"
 
 
@@ -252,6 +229,7 @@ class OrderItemAdmin(admin.ModelAdmin):
     list_display = ('id', 'order', 'product', 'quantity', 'price', 'subtotal_display', 'product_thumb')
     search_fields = ('product__name', 'order__id')
     list_per_page = 40
+    list_select_related = ('order__user', 'product__main_image')
 
     def subtotal_display(self, obj):
         try:
@@ -262,8 +240,8 @@ class OrderItemAdmin(admin.ModelAdmin):
     subtotal_display.short_description = "Sous-total"
 
     def product_thumb(self, obj):
-        if getattr(obj.product, 'images', None):
-            main_image = obj.product.images.filter(is_main=True).first()
+        if obj.product:
+            main_image = obj.product.main_image
             if main_image:
                 return format_html(
                     '<img src="{}" style="width:44px;height:44px;object-fit:cover;border-radius:6px;" />',
@@ -4,3 +4,19 @@ from django.apps import AppConfig
 class ProductsAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'products_app'
+
+    def ready(self):
+        # Connecte les signaux : index de recherche, arbre géographique, déclinaisons d'images,
+        # invalidation du cache des pages, fusion du panier à la connexion, totaux des commandes,
+        # agrégats de ventes ; vérification des connexions persistantes (Django < 4.1)
+        import myshop.routers  # noqa: F401
+        import products_app.search  # noqa: F401
+        import products_app.geo  # noqa: F401
+        import products_app.images  # noqa: F401
+        import products_app.cache  # noqa: F401
+        import products_app.cart  # noqa: F401
+        import products_app.orders  # noqa: F401
+        import products_app.sales  # noqa: F401
+
+        from products_app.cart import check_cart_store_backend
+        check_cart_store_backend()
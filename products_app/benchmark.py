@@ -0,0 +1,218 @@
+# products_app/benchmark.py
+"""
+Banc de performance de la boutique.
+
+`seed()` remplit une base SQLite jetable : géographie réelle (`load_algeria`)
+puis produits, images, clients et commandes en volumes configurables via
+`FakeShopGenerator`, de façon déterministe pour une graine donnée. `run()` rejoue ensuite les parcours
+principaux (accueil, recherche, panier, checkout, historique, listes de
+l'admin, ventes, export CSV) avec le client de test Django, éventuellement depuis
+plusieurs threads, et mesure pour chacun la latence (p50/p95), le débit et
+le nombre de requêtes SQL.
+
+Point d'entrée : `python manage.py benchmark --settings=myshop.settings_bench`.
+"""
+
+import io
+import math
+import random
+import statistics
+import threading
+import time
+from collections import Counter
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .fake_shop import FakeShopGenerator
+from .models import Cart, CartItem, Commune, Product
+from .recommendations import rebuild_recommendations
+from .sales import rebuild_sales_rollups
+
+DEFAULT_VOLUMES = {
+    "products": 500,
+    "images_per_product": 3,
+    "users": 200,
+    "orders": 2000,
+    "items_per_order": 3,
+}
+
+BENCH_PASSWORD = "bench-password"
+
+
+# -------------------------
+# Données
+# -------------------------
+def seed(volumes=None, seed=42):
+    """Remplit la base (supposée vide) et renvoie le contexte des scénarios."""
+    volumes = {**DEFAULT_VOLUMES, **(volumes or {})}
+    call_command("load_algeria", verbosity=0, stdout=io.StringIO())
+
+    generator = FakeShopGenerator(seed=seed)
+    generator.products(volumes["products"], volumes["images_per_product"])
+    generator.users(volumes["users"], password=BENCH_PASSWORD)
+    generator.orders(volumes["orders"], volumes["items_per_order"], days=90)
+    rebuild_sales_rollups()
+    rebuild_recommendations()
+
+    User = get_user_model()
+    staff = User.objects.create_superuser("bench-admin", "admin@exemple.com", BENCH_PASSWORD)
+
+    # Un panier en base pour chaque client
+    rng = random.Random(seed)
+    active = list(Product.objects.filter(is_active=True).order_by("id").values_list("id", "name"))
+    customers = list(User.objects.filter(is_staff=False).order_by("id").values_list("id", "username"))
+    with transaction.atomic():
+        Cart.objects.bulk_create([Cart(user_id=user_id) for user_id, _ in customers], batch_size=500)
+        CartItem.objects.bulk_create([
+            CartItem(cart_id=cart_id, product_id=product_id, quantity=rng.randint(1, 2))
+            for cart_id in Cart.objects.values_list("id", flat=True)
+            for product_id, _ in rng.sample(active, min(len(active), 3))
+        ], batch_size=500)
+
+    words = sorted({word for _, name in active for word in name.split()[:3]})
+    commune = Commune.objects.order_by("id").values("id", "daira_id", "daira__wilaya_id").first()
+    return {
+        "volumes": volumes,
+        "seed": seed,
+        "customers": [username for _, username in customers],
+        "staff": staff.username,
+        "product_ids": [product_id for product_id, _ in active],
+        "search_terms": [word[:4].lower() for word in words],
+        "geo": {"wilaya": commune["daira__wilaya_id"], "daira": commune["daira_id"], "commune": commune["id"]},
+    }
+
+
+# -------------------------
+# Scénarios
+# -------------------------
+class Scenario:
+    """`who` : "anonymous", "customer" ou "staff" ; `prepare` n'est pas chronométré."""
+
+    def __init__(self, name, who, request, prepare=None):
+        self.name = name
+        self.who = who
+        self.request = request
+        self.prepare = prepare
+
+
+def _pick(ctx, key, i):
+    values = ctx[key]
+    return values[i % len(values)]
+
+
+def _fill_cart(client, ctx, i):
+    client.get(reverse("products_app:add_to_cart", args=[_pick(ctx, "product_ids", i)]))
+
+
+def _checkout_post(client, ctx, i):
+    data = {
+        "full_name": "Client Banc", "email": "banc@exemple.com", "phone": "0550000000",
+        "address_details": "Rue du banc", "idempotency_key": f"bench-{time.time_ns()}-{i}",
+        **ctx["geo"],
+    }
+    return client.post(reverse("products_app:checkout"), data)
+
+
+SCENARIOS = [
+    Scenario("home", "anonymous", lambda c, ctx, i: c.get(reverse("products_app:home"))),
+    Scenario("product_detail", "anonymous",
+             lambda c, ctx, i: c.get(reverse("products_app:product_detail", args=[_pick(ctx, "product_ids", i)]))),
+    Scenario("search_products", "anonymous",
+             lambda c, ctx, i: c.get(reverse("products_app:search"), {"q": _pick(ctx, "search_terms", i)})),
+    Scenario("cart_view", "customer", lambda c, ctx, i: c.get(reverse("products_app:cart")), prepare=_fill_cart),
+    Scenario("checkout", "customer", lambda c, ctx, i: c.get(reverse("products_app:checkout")), prepare=_fill_cart),
+    Scenario("checkout_submit", "customer", _checkout_post, prepare=_fill_cart),
+    Scenario("order_history", "customer", lambda c, ctx, i: c.get(reverse("products_app:order_history"))),
+    Scenario("admin_orders", "staff", lambda c, ctx, i: c.get(reverse("products_app:admin_orders"))),
+    Scenario("admin_order_changelist", "staff",
+             lambda c, ctx, i: c.get(reverse("admin:products_app_order_changelist"))),
+    Scenario("admin_product_changelist", "staff",
+             lambda c, ctx, i: c.get(reverse("admin:products_app_product_changelist"))),
+    Scenario("admin_orderitem_changelist", "staff",
+             lambda c, ctx, i: c.get(reverse("admin:products_app_orderitem_changelist"))),
+    Scenario("sales_dashboard", "staff", lambda c, ctx, i: c.get(reverse("products_app:sales_dashboard"), {"days": 90})),
+    Scenario("export_orders_csv", "staff", lambda c, ctx, i: c.get(reverse("products_app:export_orders_csv"))),
+]
+
+
+# -------------------------
+# Exécution
+# -------------------------
+def _client(ctx, who, worker):
+    client = Client(raise_request_exception=False)  # une erreur 500 est comptée, pas fatale
+    if who != "anonymous":
+        User = get_user_model()
+        username = ctx["staff"] if who == "staff" else ctx["customers"][worker % len(ctx["customers"])]
+        client.force_login(User.objects.get(username=username))
+    return client
+
+
+def _percentile(values, percent):
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(percent / 100 * len(ordered)) - 1)]
+
+
+def _worker(scenario, ctx, worker, iterations, warmup, samples):
+    client = _client(ctx, scenario.who, worker)
+    try:
+        for i in range(warmup + iterations):
+            n = worker * (warmup + iterations) + i
+            if scenario.prepare is not None:
+                scenario.prepare(client, ctx, n)
+            with CaptureQueriesContext(connection) as queries:
+                start = time.perf_counter()
+                response = scenario.request(client, ctx, n)
+                if response.streaming:
+                    b"".join(response.streaming_content)
+                elapsed = time.perf_counter() - start
+            if i >= warmup:
+                samples.append((elapsed, len(queries), response.status_code))
+    finally:
+        connection.close()
+
+
+def run_scenario(scenario, ctx, iterations=50, warmup=5, concurrency=1):
+    samples = []
+    threads = [
+        threading.Thread(target=_worker, args=(scenario, ctx, worker, iterations, warmup, samples))
+        for worker in range(concurrency)
+    ]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - started
+
+    latencies = [s[0] * 1000 for s in samples]
+    queries = [s[1] for s in samples]
+    if not samples:
+        return {"requests": 0}
+    return {
+        "requests": len(samples),
+        "p50_ms": round(_percentile(latencies, 50), 2),
+        "p95_ms": round(_percentile(latencies, 95), 2),
+        "mean_ms": round(statistics.fmean(latencies), 2),
+        "max_ms": round(max(latencies), 2),
+        # Débit pendant les requêtes chronométrées (préparation et échauffement exclus)
+        "throughput_rps": round(len(samples) / (sum(latencies) / 1000 / concurrency), 1),
+        "wall_s": round(wall, 2),
+        "queries": {"min": min(queries), "median": statistics.median(queries), "max": max(queries)},
+        "status": dict(sorted(Counter(str(s[2]) for s in samples).items())),
+    }
+
+
+def run(ctx, names=None, iterations=50, warmup=5, concurrency=1, progress=None):
+    results = {}
+    for scenario in SCENARIOS:
+        if names and scenario.name not in names:
+            continue
+        results[scenario.name] = run_scenario(scenario, ctx, iterations, warmup, concurrency)
+        if progress is not None:
+            progress(scenario.name, results[scenario.name])
+    return results
@@ -0,0 +1,67 @@
+# products_app/board.py
+"""
+Tableau de bord staff des commandes (`admin_orders`).
+
+La liste est paginée par curseur (keyset) sur `(created_at, id)` décroissants :
+`?after=<curseur>` reprend juste après la dernière commande affichée, sans
+OFFSET, donc une page coûte pareil en tête de liste ou après des centaines de
+milliers de commandes (index `order_created_id_idx` et ses variantes par
+statut / wilaya). Les filtres sont ceux de l'export CSV (`filter_orders`).
+
+Les compteurs par statut viennent d'une seule requête d'agrégat
+conditionnel, mise en cache quelques secondes par combinaison de filtres.
+"""
+
+import hashlib
+
+from django.core.cache import cache
+from django.db.models import Count, Q
+from django.utils.dateparse import parse_datetime
+from django.utils.http import urlencode
+
+from .exports import filter_orders
+from .models import Order
+
+BOARD_PAGE_SIZE = 50
+COUNTS_CACHE_SECONDS = 30
+FILTER_PARAMS = ("status", "wilaya", "date_from", "date_to")
+
+
+def encode_cursor(order):
+    return f"{order.created_at.isoformat()}_{order.id}"
+
+
+def decode_cursor(value):
+    """'2025-01-31T10:00:00+00:00_42' -> (datetime, 42), ou None si illisible."""
+    created_at, _, pk = (value or "").rpartition("_")
+    try:
+        created_at, pk = parse_datetime(created_at), int(pk)
+    except (ValueError, TypeError):
+        return None
+    return (created_at, pk) if created_at is not None else None
+
+
+def board_page(params):
+    """Retourne `(commandes, curseur suivant ou None)` pour les filtres de `params`."""
+    queryset = filter_orders(Order.objects.all(), params)
+    cursor = decode_cursor(params.get("after"))
+    if cursor is not None:
+        created_at, pk = cursor
+        queryset = queryset.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk))
+    orders = list(queryset.select_related("wilaya").order_by("-created_at", "-id")[:BOARD_PAGE_SIZE + 1])
+    next_cursor = encode_cursor(orders[BOARD_PAGE_SIZE - 1]) if len(orders) > BOARD_PAGE_SIZE else None
+    return orders[:BOARD_PAGE_SIZE], next_cursor
+
+
+def status_counts(params):
+    """{"total": n, "pending": n, ...} avec les filtres wilaya / période (pas le statut)."""
+    base = {name: params.get(name) or "" for name in ("wilaya", "date_from", "date_to")}
+    key = "orders:status_counts:" + hashlib.md5(urlencode(sorted(base.items())).encode("utf-8")).hexdigest()
+    counts = cache.get(key)
+    if counts is None:
+        counts = filter_orders(Order.objects.all(), base).aggregate(
+            total=Count("id"),
+            **{code: Count("id", filter=Q(status=code)) for code, _ in Order.STATUS_CHOICES},
+        )
+        cache.set(key, counts, COUNTS_CACHE_SECONDS)
+    return counts
@@ -0,0 +1,98 @@
+# products_app/cache.py
+"""
+Cache des pages catalogue pour les visiteurs anonymes.
+
+Les réponses de `home` et `product_detail` sont mises en cache sous une clé
+qui contient la version du catalogue. Toute modification d'un `Product` ou
+d'un `ProductImage` (signaux `post_save` / `post_delete`, ou appel explicite
+de `bump_catalog_version()` après un `queryset.update()`) incrémente cette
+version : les anciennes pages ne sont plus jamais relues et expirent seules.
+
+La version est stockée dans le cache Django (`CACHES['default']`), partagé
+entre les workers, pour qu'une modification faite dans l'un invalide les
+pages des autres. Les pages mises en cache sont rendues depuis la base
+principale (`pin_to_primary`) : une réplique en retard ne peut pas associer
+l'ancien contenu à la nouvelle version.
+"""
+
+import hashlib
+import time
+from functools import wraps
+
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.http import HttpResponse
+
+from myshop.routers import pin_to_primary
+from .models import Product, ProductImage
+
+CATALOG_VERSION_KEY = "catalog:version"
+PAGE_CACHE_SECONDS = 60 * 15
+
+
+def get_version(key):
+    """Compteur de version partagé entre les workers (cache Django), créé au besoin."""
+    version = cache.get(key)
+    if version is None:
+        # Démarre à l'horodatage : une version ne peut pas être réutilisée après un vidage du cache
+        version = int(time.time() * 1000)
+        cache.add(key, version, timeout=None)
+        version = cache.get(key, version)
+    return version
+
+
+def bump_version(key):
+    try:
+        return cache.incr(key)
+    except ValueError:
+        version = int(time.time() * 1000)
+        cache.set(key, version, timeout=None)
+        return version
+
+
+def get_catalog_version():
+    return get_version(CATALOG_VERSION_KEY)
+
+
+def bump_catalog_version():
+    return bump_version(CATALOG_VERSION_KEY)
+
+
+def _page_key(request):
+    path = hashlib.md5(request.get_full_path().encode("utf-8")).hexdigest()
+    return f"page:{get_catalog_version()}:{path}"
+
+
+def cache_anonymous_page(view):
+    """Sert la page depuis le cache pour un GET anonyme ; sinon exécute la vue."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if request.method != "GET" or request.user.is_authenticated:
+            return view(request, *args, **kwargs)
+
+        key = _page_key(request)
+        cached = cache.get(key)
+        if cached is not None:
+            content, content_type = cached
+            return HttpResponse(content, content_type=content_type)
+
+        # Page qui remplira le cache sous la version courante : lue sur la base principale,
+        # une réplique en retard la figerait sinon jusqu'à l'expiration
+        pin_to_primary()
+        response = view(request, *args, **kwargs)
+        if response.status_code == 200 and not response.streaming:
+            if hasattr(response, "render") and callable(response.render):
+                response.render()
+            cache.set(key, (response.content, response["Content-Type"]), PAGE_CACHE_SECONDS)
+        return response
+    return wrapper
+
+
+# 🔹 Invalidation : toute écriture sur le catalogue change la version
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+def catalog_changed(sender, **kwargs):
+    bump_catalog_version()
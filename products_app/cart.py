@@ -0,0 +1,495 @@
+# products_app/cart.py
+"""
+Panier : stockage (`CartStore`) et résolution (`CartService`).
+
+Le contenu du panier est un dict `{product_id (str): quantité}`. Pour un
+utilisateur connecté, il est stocké en base (`Cart` / `CartItem`) et suit le
+client d'un appareil à l'autre. Pour un visiteur anonyme, le stockage dépend
+de `settings.CART_STORE` :
+
+- "session" : `request.session["cart"]` (comportement historique) ;
+- "cache"   : une clé de cache par ligne, incrémentée atomiquement
+              (`cache.incr`), le panier étant identifié par un cookie signé ;
+              refusé au démarrage si le cache n'est pas Redis ou Memcached
+              (`check_cart_store_backend`) ;
+- "cookie"  : le panier entier dans un cookie signé, sans stockage serveur.
+
+Chaque store n'écrit que si le panier a réellement changé ; les stores à
+cookie posent leur cookie via `CartStoreMiddleware`. À la connexion, le
+panier anonyme est fusionné dans le panier en base (`merge_anonymous_cart`).
+
+`CartService` charge ensuite tous les produits du panier en une seule
+requête (`in_bulk`), calcule les sous-totaux et le total une fois, et écarte
+les produits supprimés ou désactivés au lieu de renvoyer une 404.
+"""
+
+import json
+import uuid
+from decimal import Decimal
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.contrib.auth.signals import user_logged_in
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.dispatch import receiver
+
+from .counters import increment
+from .models import Cart, CartItem, Product
+
+SESSION_KEY = "cart"
+# Backends dont `incr` est atomique et partagé entre workers (fichiers, base, mémoire locale : non)
+ATOMIC_CACHE_BACKENDS = {
+    "django.core.cache.backends.redis.RedisCache",
+    "django_redis.cache.RedisCache",
+    "django.core.cache.backends.memcached.PyMemcacheCache",
+    "django.core.cache.backends.memcached.PyLibMCCache",
+    "django.core.cache.backends.memcached.MemcachedCache",
+}
+COOKIE_SALT = "products_app.cart"
+COOKIE_MAX_AGE = 60 * 60 * 24 * 30
+
+
+class CartStore:
+    """Interface commune ; `add` renvoie la nouvelle quantité de la ligne."""
+
+    def __init__(self, request):
+        self.request = request
+
+    def items(self):
+        raise NotImplementedError
+
+    def add(self, product_id, delta=1):
+        raise NotImplementedError
+
+    def remove(self, product_id):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+    def persist(self, response):
+        """Appelé par `CartStoreMiddleware` avant l'envoi de la réponse."""
+
+
+class SessionCartStore(CartStore):
+    def items(self):
+        return self.request.session.get(SESSION_KEY, {})
+
+    def _write(self, cart):
+        self.request.session[SESSION_KEY] = cart
+
+    def add(self, product_id, delta=1):
+        product_id = str(product_id)
+        cart = dict(self.items())
+        qty = cart.get(product_id, 0) + delta
+        if qty > 0:
+            cart[product_id] = qty
+        elif product_id in cart:
+            del cart[product_id]
+        else:
+            return 0
+        self._write(cart)
+        return max(qty, 0)
+
+    def remove(self, product_id):
+        product_id = str(product_id)
+        cart = self.items()
+        if product_id in cart:
+            cart = dict(cart)
+            del cart[product_id]
+            self._write(cart)
+
+    def clear(self):
+        if self.items():
+            self._write({})
+
+
+class SignedCookieCartStore(CartStore):
+    COOKIE_NAME = "cart"
+
+    def __init__(self, request):
+        super().__init__(request)
+        self._cart = None
+        self._dirty = False
+
+    def items(self):
+        if self._cart is None:
+            raw = self.request.get_signed_cookie(self.COOKIE_NAME, default=None, salt=COOKIE_SALT)
+            try:
+                self._cart = {str(k): int(v) for k, v in json.loads(raw).items()} if raw else {}
+            except (ValueError, TypeError, AttributeError):
+                self._cart = {}
+        return self._cart
+
+    def add(self, product_id, delta=1):
+        product_id = str(product_id)
+        cart = self.items()
+        qty = cart.get(product_id, 0) + delta
+        if qty > 0:
+            cart[product_id] = qty
+        elif cart.pop(product_id, None) is None:
+            return 0
+        self._dirty = True
+        return max(qty, 0)
+
+    def remove(self, product_id):
+        if self.items().pop(str(product_id), None) is not None:
+            self._dirty = True
+
+    def clear(self):
+        if self.items():
+            self._cart = {}
+            self._dirty = True
+
+    def persist(self, response):
+        if not self._dirty:
+            return
+        if self._cart:
+            response.set_signed_cookie(
+                self.COOKIE_NAME, json.dumps(self._cart, separators=(",", ":")),
+                salt=COOKIE_SALT, max_age=COOKIE_MAX_AGE, httponly=True, samesite="Lax",
+            )
+        else:
+            response.delete_cookie(self.COOKIE_NAME)
+
+
+class CacheCartStore(CartStore):
+    """Une clé par ligne (`cart:<id>:<product_id>`), retrouvée via des emplacements numérotés.
+
+    Deux onglets qui ajoutent en même temps le même produit passent par
+    `cache.incr`, atomique sur Redis/Memcached — seuls backends acceptés
+    (`check_cart_store_backend`) : aucune mise à jour perdue.
+    Il n'y a pas de liste partagée à relire puis réécrire : chaque nouvelle
+    ligne réserve un emplacement par `cache.incr` sur un compteur
+    (`cart:<id>:slots`) puis y inscrit son produit (`cart:<id>:slot:<n>`).
+    Deux ajouts simultanés de produits différents obtiennent donc deux
+    emplacements distincts. Une ligne supprimée garde son emplacement
+    (ignoré tant que la ligne n'existe pas) ; `clear` remet tout à zéro.
+    """
+    COOKIE_NAME = "cart_id"
+
+    def __init__(self, request):
+        super().__init__(request)
+        self.cart_id = request.get_signed_cookie(self.COOKIE_NAME, default=None, salt=COOKIE_SALT)
+        self._new_id = False
+
+    def _ensure_id(self):
+        if not self.cart_id:
+            self.cart_id = uuid.uuid4().hex
+            self._new_id = True
+
+    def _slots_key(self):
+        return f"cart:{self.cart_id}:slots"
+
+    def _slot_key(self, slot):
+        return f"cart:{self.cart_id}:slot:{slot}"
+
+    def _line_key(self, product_id):
+        return f"cart:{self.cart_id}:{product_id}"
+
+    def _slot_keys(self):
+        return [self._slot_key(slot) for slot in range(1, (cache.get(self._slots_key()) or 0) + 1)]
+
+    def _product_ids(self):
+        """Produits inscrits dans les emplacements, sans doublon, dans l'ordre d'ajout."""
+        slots = cache.get_many(self._slot_keys())
+        return list(dict.fromkeys(slots[key] for key in self._slot_keys() if key in slots))
+
+    def _register(self, product_id):
+        # Réservation atomique d'un emplacement : jamais écrasé par un autre ajout
+        for _ in range(3):
+            cache.add(self._slots_key(), 0, COOKIE_MAX_AGE)
+            try:
+                slot = cache.incr(self._slots_key())
+                break
+            except ValueError:
+                continue  # compteur expiré entre add et incr
+        else:
+            return
+        cache.set(self._slot_key(slot), product_id, COOKIE_MAX_AGE)
+        cache.touch(self._slots_key(), COOKIE_MAX_AGE)
+
+    def items(self):
+        if not self.cart_id:
+            return {}
+        product_ids = self._product_ids()
+        lines = cache.get_many([self._line_key(pid) for pid in product_ids])
+        return {pid: lines[self._line_key(pid)] for pid in product_ids if lines.get(self._line_key(pid), 0) > 0}
+
+    def add(self, product_id, delta=1):
+        product_id = str(product_id)
+        self._ensure_id()
+        key = self._line_key(product_id)
+        if delta > 0 and cache.add(key, delta, COOKIE_MAX_AGE):
+            self._register(product_id)
+            return delta
+        try:
+            qty = cache.incr(key, delta)
+        except ValueError:
+            # Ligne absente (ou expirée entre-temps)
+            if delta <= 0:
+                return 0
+            if not cache.add(key, delta, COOKIE_MAX_AGE):
+                return cache.incr(key, delta)
+            self._register(product_id)
+            return delta
+        if qty <= 0:
+            self.remove(product_id)
+            return 0
+        return qty
+
+    def remove(self, product_id):
+        if not self.cart_id:
+            return
+        # L'emplacement reste : sans ligne, le produit n'apparaît plus dans items()
+        cache.delete(self._line_key(str(product_id)))
+
+    def clear(self):
+        if not self.cart_id:
+            return
+        keys = self._slot_keys()
+        product_ids = self._product_ids()
+        cache.delete_many([self._line_key(pid) for pid in product_ids] + keys + [self._slots_key()])
+
+    def persist(self, response):
+        if self._new_id:
+            response.set_signed_cookie(
+                self.COOKIE_NAME, self.cart_id, salt=COOKIE_SALT,
+                max_age=COOKIE_MAX_AGE, httponly=True, samesite="Lax",
+            )
+
+
+class DatabaseCartStore(CartStore):
+    """Panier en base d'un utilisateur connecté : une ligne `CartItem` par produit.
+
+    Les quantités sont modifiées par `UPDATE ... SET quantity = quantity + n`,
+    sans relire la ligne.
+    """
+
+    def __init__(self, request):
+        super().__init__(request)
+        self._cart_id = None
+
+    def _cart(self, create=False):
+        if self._cart_id is None:
+            if create:
+                self._cart_id = Cart.objects.get_or_create(user=self.request.user)[0].id
+            else:
+                self._cart_id = Cart.objects.filter(user=self.request.user).values_list("id", flat=True).first()
+        return self._cart_id
+
+    def items(self):
+        if self._cart() is None:
+            return {}
+        lines = CartItem.objects.filter(cart_id=self._cart_id).values_list("product_id", "quantity")
+        return {str(product_id): qty for product_id, qty in lines}
+
+    def add(self, product_id, delta=1):
+        cart_id = self._cart(create=delta > 0)
+        if cart_id is None:
+            return 0
+        lines = CartItem.objects.filter(cart_id=cart_id, product_id=product_id)
+        if delta < 0:
+            lines.filter(quantity__lte=-delta).delete()
+        if lines.update(quantity=F("quantity") + delta):
+            return lines.values_list("quantity", flat=True).first() or 0
+        if delta <= 0:
+            return 0
+        try:
+            with transaction.atomic():
+                CartItem.objects.create(cart_id=cart_id, product_id=product_id, quantity=delta)
+        except IntegrityError:
+            # Ligne créée entre-temps par une autre requête
+            lines.update(quantity=F("quantity") + delta)
+        return delta
+
+    def remove(self, product_id):
+        if self._cart() is not None:
+            CartItem.objects.filter(cart_id=self._cart_id, product_id=product_id).delete()
+
+    def clear(self):
+        if self._cart() is not None:
+            CartItem.objects.filter(cart_id=self._cart_id).delete()
+
+
+CART_STORES = {
+    "session": SessionCartStore,
+    "cookie": SignedCookieCartStore,
+    "cache": CacheCartStore,
+}
+
+
+def check_cart_store_backend():
+    """Refuse `CART_STORE = "cache"` sur un cache sans incréments atomiques partagés."""
+    if getattr(settings, "CART_STORE", "session") != "cache":
+        return
+    backend = settings.CACHES.get("default", {}).get("BACKEND", "")
+    if backend not in ATOMIC_CACHE_BACKENDS:
+        raise ImproperlyConfigured(
+            f'CART_STORE = "cache" exige Redis ou Memcached (cache.incr atomique entre workers), '
+            f'pas {backend} : utiliser "session" ou "cookie".'
+        )
+
+
+def _request_store(request, store_class):
+    stores = request.__dict__.setdefault("_cart_stores", {})
+    if store_class not in stores:
+        stores[store_class] = store_class(request)
+    return stores[store_class]
+
+
+def get_anonymous_cart_store(request):
+    return _request_store(request, CART_STORES[getattr(settings, "CART_STORE", "session")])
+
+
+def get_cart_store(request):
+    """Store du panier pour cette requête (une seule instance par requête)."""
+    if request.user.is_authenticated:
+        return _request_store(request, DatabaseCartStore)
+    return get_anonymous_cart_store(request)
+
+
+def merge_anonymous_cart(request, user):
+    """Fusionne le panier anonyme dans le panier en base de `user`.
+
+    Quantités additionnées par `counters.increment` (un UPDATE groupé des lignes
+    existantes, un `bulk_create` des manquantes) ; le panier anonyme est ensuite vidé.
+    """
+    anonymous = get_anonymous_cart_store(request)
+    wanted = {}
+    for product_id, qty in anonymous.items().items():
+        try:
+            qty = int(qty)
+            if qty > 0:
+                wanted[int(product_id)] = qty
+        except (ValueError, TypeError):
+            continue
+    if not wanted:
+        return 0
+
+    valid = set(Product.objects.filter(id__in=wanted, is_active=True).values_list("id", flat=True))
+    with transaction.atomic():
+        cart, _ = Cart.objects.get_or_create(user=user)
+        increment(CartItem, ("cart_id", "product_id"), {
+            (cart.id, product_id): {"quantity": wanted[product_id]} for product_id in valid
+        })
+    anonymous.clear()
+    return len(valid)
+
+
+@receiver(user_logged_in)
+def merge_cart_on_login(sender, request, user, **kwargs):
+    if request is not None:
+        merge_anonymous_cart(request, user)
+
+
+class CartStoreMiddleware:
+    """Laisse le store du panier poser ses cookies sur la réponse."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        # Sous ASGI, pas d'aller-retour thread <-> boucle pour ce middleware
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        return self._persist(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        return self._persist(request, await self.get_response(request))
+
+    @staticmethod
+    def _persist(request, response):
+        # Pose de cookies uniquement : aucune entrée/sortie
+        for store in getattr(request, "_cart_stores", {}).values():
+            store.persist(response)
+        return response
+
+
+class CartService:
+    def __init__(self, request):
+        self.request = request
+        self.store = get_cart_store(request)
+        self._lines = None
+        self._unavailable = None
+        self._total = None
+
+    @property
+    def raw(self):
+        return self.store.items()
+
+    def _resolve(self):
+        if self._lines is not None:
+            return
+        cart = self.raw
+        ids = []
+        for product_id in cart:
+            try:
+                ids.append(int(product_id))
+            except (ValueError, TypeError):
+                continue
+        products = Product.objects.in_bulk(ids) if ids else {}
+
+        self._lines = []
+        self._unavailable = []
+        for product_id, qty in cart.items():
+            try:
+                product = products.get(int(product_id))
+            except (ValueError, TypeError):
+                product = None
+            if product is None or not product.is_active or qty < 1:
+                self._unavailable.append(product_id)
+                continue
+            self._lines.append({"product": product, "qty": qty, "subtotal": product.price * qty})
+        self._total = sum((line["subtotal"] for line in self._lines), Decimal("0.00"))
+
+    @property
+    def lines(self):
+        self._resolve()
+        return self._lines
+
+    @property
+    def unavailable(self):
+        """Clés du panier dont le produit n'existe plus ou n'est plus actif."""
+        self._resolve()
+        return self._unavailable
+
+    @property
+    def total(self):
+        self._resolve()
+        return self._total
+
+    @property
+    def count(self):
+        return sum(line["qty"] for line in self.lines)
+
+    def __bool__(self):
+        return bool(self.lines)
+
+    def prune(self):
+        """Retire du panier les produits indisponibles.
+
+        Retourne le nombre de lignes retirées.
+        """
+        if not self.unavailable:
+            return 0
+        for product_id in self.unavailable:
+            self.store.remove(product_id)
+        removed = len(self._unavailable)
+        self._unavailable = []
+        return removed
+
+    def clear(self):
+        self.store.clear()
+
+    def context(self):
+        return {"cart": self, "cart_items": self.lines, "total": self.total}
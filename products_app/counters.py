@@ -0,0 +1,72 @@
+# products_app/counters.py
+"""
+Compteurs en base : incréments groupés sur des lignes identifiées par une clé.
+
+`increment` ajoute des valeurs à plusieurs lignes d'une même table (agrégats
+de ventes, paires de recommandations) en un nombre de requêtes fixe, quel que
+soit le nombre de lignes touchées :
+- une lecture des clés déjà présentes ;
+- un seul `UPDATE ... SET x = x + CASE WHEN <clé> THEN n ... END` ;
+- un `bulk_create` des lignes manquantes.
+
+Les incréments sont calculés par la base (`F()`) : deux requêtes simultanées
+ne s'écrasent pas. Si une autre requête crée une des lignes manquantes entre
+la lecture et l'insertion, la contrainte d'unicité lève `IntegrityError` et
+ces lignes sont incrémentées au tour suivant.
+"""
+
+from functools import reduce
+from operator import or_
+
+from django.db import IntegrityError, router, transaction
+from django.db.models import Case, F, Q, Value, When
+
+
+def _match(key_fields, key):
+    return Q(**dict(zip(key_fields, key)))
+
+
+def increment(model, key_fields, deltas):
+    """Ajoute `deltas` (`{clé: {champ: incrément}}`) aux lignes de `model`.
+
+    Une clé est le tuple des valeurs de `key_fields`. Une ligne absente est
+    créée avec ses incréments s'il y en a un positif ; sinon rien n'est retiré
+    (ligne supprimée avec son produit, ou agrégats à reconstruire).
+    """
+    deltas = {key: values for key, values in deltas.items() if any(values.values())}
+    db = router.db_for_write(model)
+    manager = model._default_manager.using(db)
+    for attempt in range(2):
+        if not deltas:
+            return
+        existing = set(
+            manager.filter(reduce(or_, (_match(key_fields, key) for key in deltas)))
+            .values_list(*key_fields)
+        )
+        present = [key for key in deltas if key in existing]
+        if present:
+            fields = {field for key in present for field in deltas[key]}
+            manager.filter(reduce(or_, (_match(key_fields, key) for key in present))).update(**{
+                field: F(field) + Case(
+                    *(When(_match(key_fields, key), then=Value(deltas[key][field]))
+                      for key in present if deltas[key].get(field)),
+                    default=Value(0),
+                    output_field=model._meta.get_field(field),
+                )
+                for field in fields
+            })
+
+        deltas = {
+            key: values for key, values in deltas.items()
+            if key not in existing and any(value > 0 for value in values.values())
+        }
+        if not deltas:
+            return
+        try:
+            with transaction.atomic(using=db):
+                manager.bulk_create([model(**dict(zip(key_fields, key)), **values) for key, values in deltas.items()])
+            return
+        except IntegrityError:
+            # Créées entre-temps par une autre requête : incrémentées au tour suivant
+            if attempt:
+                raise
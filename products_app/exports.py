@@ -0,0 +1,140 @@
+# products_app/exports.py
+"""
+Export CSV des commandes en streaming.
+
+Les commandes sont lues par lots d'id croissants (keyset, sans OFFSET),
+relations client/adresse jointes (`select_related`) ; les articles et leurs
+produits sont préchargés pour chaque lot (`prefetch_related_objects`) : trois
+requêtes par lot, quel que soit le nombre d'articles. La mémoire utilisée
+reste constante quel que soit le nombre de commandes exportées, et la
+compression gzip optionnelle est faite au fil de l'eau.
+"""
+
+import csv
+import zlib
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.db.models import prefetch_related_objects
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from .models import Order
+
+CHUNK_SIZE = 500
+
+HEADER = [
+    'Order ID', 'Utilisateur', 'Nom complet', 'Email', 'Téléphone',
+    'Statut', 'Montant total (DA)', 'Wilaya', 'Daira', 'Commune', 'Adresse détaillée',
+    'Nb articles', 'Articles détail', 'Date création'
+]
+
+
+class Echo:
+    """Pseudo-fichier : `csv.writer` y écrit, on récupère la ligne formatée."""
+    def write(self, value):
+        return value
+
+
+def start_of_day(day):
+    """Minuit (fuseau local) du jour `day`, pour filtrer un `DateTimeField` par jour."""
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def _date_param(params, name):
+    """Date AAAA-MM-JJ du paramètre, ou None si absente, mal formée ou impossible (2025-02-30)."""
+    try:
+        return parse_date(params.get(name) or '')
+    except ValueError:
+        return None
+
+
+def filter_orders(queryset, params):
+    """Applique les filtres `date_from`, `date_to` (AAAA-MM-JJ), `status` et `wilaya`.
+
+    Les dates deviennent des bornes sur `created_at` lui-même (et non
+    `created_at__date`) pour que les index sur `created_at` restent utilisables.
+    """
+    date_from = _date_param(params, 'date_from')
+    date_to = _date_param(params, 'date_to')
+    if date_from:
+        queryset = queryset.filter(created_at__gte=start_of_day(date_from))
+    if date_to:
+        queryset = queryset.filter(created_at__lt=start_of_day(date_to + timedelta(days=1)))
+    if params.get('status'):
+        queryset = queryset.filter(status=params['status'])
+    if params.get('wilaya'):
+        try:
+            queryset = queryset.filter(wilaya_id=int(params['wilaya']))
+        except (ValueError, TypeError):
+            pass
+    return queryset
+
+
+def _order_row(order):
+    items = order.items.all()
+    items_desc = []
+    for item in items:
+        line_sub = (item.price or Decimal('0.00')) * item.quantity
+        pname = item.product.name if item.product else "(produit supprimé)"
+        items_desc.append(f"{item.quantity}x {pname} @ {item.price:,.2f} DA = {line_sub:,.2f} DA")
+    return [
+        order.id,
+        order.user.username if order.user else '',
+        order.full_name,
+        order.email,
+        order.phone,
+        order.get_status_display(),
+        f"{order.total:,.2f}",
+        order.wilaya.name if order.wilaya else '',
+        order.daira.name if order.daira else '',
+        order.commune.name if order.commune else '',
+        order.address_details,
+        len(items),
+        " | ".join(items_desc),
+        order.created_at.strftime("%Y-%m-%d %H:%M:%S")
+    ]
+
+
+def order_rows(queryset, chunk_size=CHUNK_SIZE):
+    yield HEADER
+    orders = queryset.select_related('user', 'wilaya', 'daira', 'commune').order_by('id')
+    last_id = 0
+    while True:
+        # `.iterator()` ignore `prefetch_related` avant Django 4.1 : lots explicites
+        chunk = list(orders.filter(id__gt=last_id)[:chunk_size])
+        if not chunk:
+            return
+        last_id = chunk[-1].id
+        prefetch_related_objects(chunk, 'items__product')
+        yield from (_order_row(order) for order in chunk)
+
+
+def _gzip(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def stream_orders_csv(queryset, filename="orders_export.csv", gzip=False):
+    writer = csv.writer(Echo())
+    lines = (writer.writerow(row) for row in order_rows(queryset))
+    if gzip:
+        response = StreamingHttpResponse(_gzip(lines), content_type='application/gzip')
+        filename += '.gz'
+    else:
+        response = StreamingHttpResponse(lines, content_type='text/csv; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+def export_response(request, queryset=None):
+    """Réponse d'export à partir des paramètres GET (filtres + `gzip=1`)."""
+    if queryset is None:
+        queryset = Order.objects.all()
+    queryset = filter_orders(queryset, request.GET)
+    return stream_orders_csv(queryset, gzip=request.GET.get('gzip') == '1')
@@ -0,0 +1,195 @@
+# products_app/fake_shop.py
+"""
+Générateur déterministe de données de test (catalogue, clients, commandes).
+
+Pour une même graine et une même base de départ, `FakeShopGenerator` produit
+exactement les mêmes lignes. Les identifiants sont attribués d'avance à partir
+du plus grand id existant : un produit connaît l'id de son image principale
+avant l'insertion, une commande celui de ses lignes, et tout part en
+`bulk_create` par lots (une transaction par lot), sans passer par `save()` ni
+par les signaux `post_save` (profil, index de recherche, cache du catalogue).
+
+Les adresses suivent la géographie réelle chargée par `load_algeria` : une
+commande tombe dans une commune tirée uniformément, donc chaque wilaya reçoit
+des commandes en proportion de son nombre de communes. La popularité des
+produits est volontairement inégale (quelques produits vedettes, une longue
+traîne), comme dans une vraie boutique.
+"""
+
+import random
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from accounts.models import Profile
+
+from .models import Commune, Order, OrderItem, Product, ProductImage
+
+DEFAULT_PASSWORD = "motdepasse-test"
+
+_NOUNS = ["Maillot", "Chaussures", "Sac", "Montre", "Casquette", "Veste", "Short", "Ballon", "Gants", "Lunettes",
+          "Survêtement", "Sandales", "Écharpe", "Parfum", "Ceinture", "Portefeuille", "Sweat", "Bonnet"]
+_QUALIFIERS = ["Sport", "Classique", "Premium", "Enfant", "Femme", "Homme", "Édition", "Pro", "Urbain", "Été",
+               "Hiver", "Vintage", "Slim", "Confort", "Luxe"]
+_COLORS = ["noir", "blanc", "rouge", "bleu", "vert", "gris", "doré", "rose", "kaki", "marine", "beige", "bordeaux"]
+_FIRST_NAMES = ["Amine", "Yacine", "Karim", "Sofiane", "Walid", "Riad", "Nassim", "Mehdi", "Ilyes", "Anis",
+                "Amel", "Sarah", "Lina", "Yasmine", "Meriem", "Nour", "Imane", "Lydia", "Ines", "Rania"]
+_LAST_NAMES = ["Benali", "Bouzid", "Cherif", "Djebbar", "Haddad", "Kaci", "Mansouri", "Meziane", "Rahmani",
+               "Saidi", "Belkacem", "Ferhat", "Hamidi", "Larbi", "Ouali", "Tahar", "Zerrouki", "Amrani"]
+# Poids des statuts d'une commande
+_STATUSES = (("completed", 70), ("pending", 20), ("cancelled", 10))
+
+
+def _next_id(model):
+    return (model.objects.aggregate(m=Max("id"))["m"] or 0) + 1
+
+
+def _chunks(start, count, size):
+    """(premier id, nombre) des lots successifs."""
+    for offset in range(0, count, size):
+        yield start + offset, min(size, count - offset)
+
+
+@contextmanager
+def _keep_created_at():
+    """`auto_now_add` écraserait les dates générées : on le coupe le temps de l'insertion."""
+    field = Order._meta.get_field("created_at")
+    field.auto_now_add = False
+    try:
+        yield
+    finally:
+        field.auto_now_add = True
+
+
+class FakeShopGenerator:
+    def __init__(self, seed=42, batch_size=5000, progress=None):
+        self.rng = random.Random(seed)
+        self.batch_size = batch_size
+        self.progress = progress or (lambda label, done, total: None)
+
+    def _zipf_index(self, size):
+        # Index biaisé vers 0 : les premiers éléments sortent beaucoup plus souvent
+        return min(size - 1, int(size * self.rng.random() ** 3))
+
+    # -------------------------
+    # Catalogue
+    # -------------------------
+    def products(self, count, images_per_product=3, inactive_ratio=0.05):
+        rng = self.rng
+        product_id, image_id = _next_id(Product), _next_id(ProductImage)
+        per_batch = max(1, self.batch_size // max(1, images_per_product))
+        created = 0
+        for first, size in _chunks(product_id, count, per_batch):
+            products, images = [], []
+            for pk in range(first, first + size):
+                name = f"{rng.choice(_NOUNS)} {rng.choice(_QUALIFIERS)} {rng.choice(_COLORS)} {pk}"
+                main_path = f"products/fake/{pk}_0.jpg" if images_per_product else None
+                products.append(Product(
+                    id=pk, name=name, price=Decimal(rng.randrange(300, 60000)) / 100,
+                    is_active=rng.random() >= inactive_ratio,
+                    image=main_path, main_image_id=image_id if images_per_product else None,
+                ))
+                for position in range(images_per_product):
+                    images.append(ProductImage(
+                        id=image_id, product_id=pk, image=f"products/fake/{pk}_{position}.jpg", is_main=position == 0,
+                    ))
+                    image_id += 1
+            with transaction.atomic():
+                Product.objects.bulk_create(products, batch_size=self.batch_size)
+                ProductImage.objects.bulk_create(images, batch_size=self.batch_size)
+            created += size
+            self.progress("Produits", created, count)
+        return created
+
+    # -------------------------
+    # Clients
+    # -------------------------
+    def users(self, count, password=DEFAULT_PASSWORD):
+        rng = self.rng
+        User = get_user_model()
+        hashed = make_password(password)  # un seul hachage, partagé par tous les comptes
+        joined = timezone.now()
+        created = 0
+        for first, size in _chunks(_next_id(User), count, self.batch_size):
+            users, profiles = [], []
+            for pk in range(first, first + size):
+                first_name, last_name = rng.choice(_FIRST_NAMES), rng.choice(_LAST_NAMES)
+                users.append(User(
+                    id=pk, username=f"client{pk}", email=f"client{pk}@exemple.com", password=hashed,
+                    first_name=first_name, last_name=last_name,
+                    date_joined=joined - timedelta(minutes=rng.randrange(2 * 365 * 24 * 60)),
+                ))
+                profiles.append(Profile(user_id=pk, phone=f"05{rng.randrange(10 ** 8):08d}"))
+            with transaction.atomic():
+                User.objects.bulk_create(users, batch_size=self.batch_size)
+                Profile.objects.bulk_create(profiles, batch_size=self.batch_size)
+            created += size
+            self.progress("Clients", created, count)
+        return created
+
+    # -------------------------
+    # Commandes
+    # -------------------------
+    def orders(self, count, items_per_order=3, days=365):
+        rng = self.rng
+        User = get_user_model()
+        user_ids = list(User.objects.filter(is_staff=False).order_by("id").values_list("id", flat=True))
+        catalog = list(Product.objects.filter(is_active=True).order_by("id").values_list("id", "price"))
+        communes = list(Commune.objects.order_by("id").values_list("id", "daira_id", "daira__wilaya_id"))
+        if not (user_ids and catalog and communes):
+            raise ValueError("Il faut des clients, des produits actifs et des communes (load_algeria) pour générer des commandes.")
+
+        statuses = [code for code, _ in _STATUSES]
+        weights = [weight for _, weight in _STATUSES]
+        now = timezone.now()
+        item_id = _next_id(OrderItem)
+        per_batch = max(1, self.batch_size // max(1, items_per_order))
+        created = 0
+        with _keep_created_at():
+            for first, size in _chunks(_next_id(Order), count, per_batch):
+                orders, items = [], []
+                for pk in range(first, first + size):
+                    user_id = rng.choice(user_ids)
+                    commune_id, daira_id, wilaya_id = rng.choice(communes)
+                    chosen = {catalog[self._zipf_index(len(catalog))] for _ in range(rng.randint(1, items_per_order))}
+                    total, items_count = Decimal(0), 0
+                    for product_id, price in sorted(chosen):
+                        quantity = rng.choices((1, 2, 3), weights=(80, 15, 5))[0]
+                        total += price * quantity
+                        items_count += quantity
+                        items.append(OrderItem(id=item_id, order_id=pk, product_id=product_id,
+                                               quantity=quantity, price=price))
+                        item_id += 1
+                    orders.append(Order(
+                        id=pk, user_id=user_id, full_name=f"Client {user_id}", email=f"client{user_id}@exemple.com",
+                        phone=f"05{rng.randrange(10 ** 8):08d}", wilaya_id=wilaya_id, daira_id=daira_id,
+                        commune_id=commune_id, address_details=f"{rng.randint(1, 200)} rue de la Liberté",
+                        total=total, items_count=items_count, status=rng.choices(statuses, weights=weights)[0],
+                        created_at=now - timedelta(seconds=rng.randrange(days * 24 * 3600)),
+                    ))
+                with transaction.atomic():
+                    Order.objects.bulk_create(orders, batch_size=self.batch_size)
+                    OrderItem.objects.bulk_create(items, batch_size=self.batch_size)
+                created += size
+                self.progress("Commandes", created, count)
+        return created
+
+    # -------------------------
+    # Fin de génération
+    # -------------------------
+    @staticmethod
+    def reset_sequences():
+        """Les ids ont été fixés à la main : recale les séquences (PostgreSQL, Oracle)."""
+        models = [Product, ProductImage, get_user_model(), Profile, Order, OrderItem]
+        statements = connection.ops.sequence_reset_sql(no_style(), models)
+        if statements:
+            with connection.cursor() as cursor:
+                for sql in statements:
+                    cursor.execute(sql)
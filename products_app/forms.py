@@ -1,6 +1,6 @@
 # forms.py
 from django import forms
-from .models import Order, Wilaya, Daira, Commune
+from .geo import get_tree
 
 class CheckoutForm(forms.Form):
     full_name = forms.CharField(
@@ -18,22 +18,20 @@ class CheckoutForm(forms.Form):
         widget=forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'Votre numéro de téléphone', 'required': 'required'})
     )
 
-    wilaya = forms.ModelChoiceField(
-        queryset=Wilaya.objects.all(),
+    # Les choix viennent de l'arbre en mémoire (products_app.geo) : aucune requête
+    wilaya = forms.TypedChoiceField(
+        coerce=int,
         label="Wilaya *",
-        empty_label="-- Sélectionner une wilaya --",
         widget=forms.Select(attrs={'class': 'form-select'})
     )
-    daira = forms.ModelChoiceField(
-        queryset=Daira.objects.none(),
+    daira = forms.TypedChoiceField(
+        coerce=int,
         label="Daira *",
-        empty_label="-- Sélectionner une daira --",
         widget=forms.Select(attrs={'class': 'form-select'})
     )
-    commune = forms.ModelChoiceField(
-        queryset=Commune.objects.none(),
+    commune = forms.TypedChoiceField(
+        coerce=int,
         label="Commune *",
-        empty_label="-- Sélectionner une commune --",
         widget=forms.Select(attrs={'class': 'form-select'})
     )
 
@@ -42,32 +40,35 @@ class CheckoutForm(forms.Form):
         widget=forms.Textarea(attrs={'class': 'form-control', 'placeholder': 'Rue, numéro, immeuble, etc.', 'rows': 3, 'required': 'required'})
     )
 
+    # Clé générée à l'affichage du formulaire : identifie une tentative de commande
+    idempotency_key = forms.CharField(max_length=64, required=False, widget=forms.HiddenInput)
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        
-        # Mettre à jour dynamiquement le queryset des champs daira et commune
+        tree = get_tree()
+
+        # Mettre à jour dynamiquement les choix des champs daira et commune
+        daira_choices = []
+        commune_choices = []
         if 'wilaya' in self.data:
             try:
-                wilaya_id = int(self.data.get('wilaya'))
-                self.fields['daira'].queryset = Daira.objects.filter(wilaya_id=wilaya_id).order_by('name')
+                daira_choices = tree.daira_choices(int(self.data.get('wilaya')))
             except (ValueError, TypeError):
                 pass
-        
+
         if 'daira' in self.data:
             try:
-                daira_id = int(self.data.get('daira'))
-                self.fields['commune'].queryset = Commune.objects.filter(daira_id=daira_id).order_by('name')
+                commune_choices = tree.commune_choices(int(self.data.get('daira')))
             except (ValueError, TypeError):
                 pass
 
-        # Gérer les labels d'instance
-        self.fields['wilaya'].label_from_instance = lambda obj: f"{obj.id} - {obj.name}"
-        self.fields['daira'].label_from_instance = lambda obj: f"{obj.name}"
-        self.fields['commune'].label_from_instance = lambda obj: f"{obj.name}"
-        
-        # Le formulaire est-il posté ?
-        is_posted = self.is_bound and self.is_valid()
-        
-        # Rendre les champs obligatoires
-        self.fields['daira'].required = True
-        self.fields['commune'].required = True
\ No newline at end of file
+        self.fields['wilaya'].choices = [('', "-- Sélectionner une wilaya --")] + tree.wilaya_choices()
+        self.fields['daira'].choices = [('', "-- Sélectionner une daira --")] + daira_choices
+        self.fields['commune'].choices = [('', "-- Sélectionner une commune --")] + commune_choices
+
+    def clean(self):
+        cleaned_data = super().clean()
+        wilaya, daira, commune = (cleaned_data.get(f) for f in ('wilaya', 'daira', 'commune'))
+        if None not in (wilaya, daira, commune) and not get_tree().is_consistent(wilaya, daira, commune):
+            raise forms.ValidationError("La commune sélectionnée ne correspond pas à la daira et à la wilaya.")
+        return cleaned_data
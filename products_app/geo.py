@@ -0,0 +1,160 @@
+# products_app/geo.py
+"""
+Arbre administratif algérien (Wilaya → Daira → Commune) en mémoire.
+
+Ces données de référence ne changent presque jamais : chaque worker les
+charge une fois (3 requêtes `values_list`) dans une structure compacte de
+dicts et de tuples, avec une version calculée sur le contenu. Les endpoints
+AJAX et `CheckoutForm` lisent cet arbre sans toucher la base ; la version
+sert d'ETag pour que les navigateurs gardent le JSON en cache.
+
+Un compteur partagé dans le cache Django (`GEO_VERSION_KEY`) est incrémenté
+à chaque modification (signaux, `load_algeria`) : chaque worker le compare à
+celui de son arbre avant de le servir et recharge l'arbre s'il a changé.
+"""
+
+import hashlib
+import json
+import threading
+from collections import defaultdict
+from functools import cached_property
+
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models.signals import post_delete, post_save
+
+from .cache import bump_version, get_version
+from .models import Commune, Daira, Wilaya
+
+GEO_VERSION_KEY = "geo:version"
+
+
+class GeoTree:
+    def __init__(self, wilayas, dairas, communes):
+        # {id: nom}, {id: (nom, wilaya_id)}, {id: (nom, daira_id)}
+        self.wilayas = dict(wilayas)
+        self.dairas = {pk: (name, parent) for pk, name, parent in dairas}
+        self.communes = {pk: (name, parent) for pk, name, parent in communes}
+
+        dairas_by_wilaya = defaultdict(list)
+        for pk, (name, wilaya_id) in self.dairas.items():
+            dairas_by_wilaya[wilaya_id].append(pk)
+        communes_by_daira = defaultdict(list)
+        for pk, (name, daira_id) in self.communes.items():
+            communes_by_daira[daira_id].append(pk)
+        self.dairas_by_wilaya = {
+            wilaya_id: sorted(ids, key=lambda pk: self.dairas[pk][0])
+            for wilaya_id, ids in dairas_by_wilaya.items()
+        }
+        self.communes_by_daira = {
+            daira_id: sorted(ids, key=lambda pk: self.communes[pk][0])
+            for daira_id, ids in communes_by_daira.items()
+        }
+
+        digest = hashlib.sha1(self.json.encode("utf-8"))
+        self.version = digest.hexdigest()[:16]
+        self.source_version = None  # valeur de GEO_VERSION_KEY au chargement
+
+    @classmethod
+    def from_db(cls):
+        # Base principale : chargé sous la version partagée courante, un arbre lu sur une
+        # réplique en retard resterait servi jusqu'à la modification suivante
+        return cls(
+            Wilaya.objects.using(DEFAULT_DB_ALIAS).values_list("id", "name"),
+            Daira.objects.using(DEFAULT_DB_ALIAS).values_list("id", "name", "wilaya_id"),
+            Commune.objects.using(DEFAULT_DB_ALIAS).values_list("id", "name", "daira_id"),
+        )
+
+    # -------------------------
+    # Accès par nœud
+    # -------------------------
+    def dairas_of(self, wilaya_id):
+        return [{"id": pk, "name": self.dairas[pk][0]} for pk in self.dairas_by_wilaya.get(wilaya_id, ())]
+
+    def communes_of(self, daira_id):
+        return [{"id": pk, "name": self.communes[pk][0]} for pk in self.communes_by_daira.get(daira_id, ())]
+
+    def is_consistent(self, wilaya_id, daira_id, commune_id):
+        """Vrai si la commune appartient à la daira, elle-même dans la wilaya."""
+        daira = self.dairas.get(daira_id)
+        commune = self.communes.get(commune_id)
+        return (
+            wilaya_id in self.wilayas
+            and daira is not None and daira[1] == wilaya_id
+            and commune is not None and commune[1] == daira_id
+        )
+
+    # -------------------------
+    # Choix pour les formulaires
+    # -------------------------
+    def wilaya_choices(self):
+        return [(pk, f"{pk} - {name}") for pk, name in sorted(self.wilayas.items())]
+
+    def daira_choices(self, wilaya_id):
+        return [(d["id"], d["name"]) for d in self.dairas_of(wilaya_id)]
+
+    def commune_choices(self, daira_id):
+        return [(c["id"], c["name"]) for c in self.communes_of(daira_id)]
+
+    # -------------------------
+    # Sérialisation
+    # -------------------------
+    @cached_property
+    def json(self):
+        tree = [
+            {
+                "id": wilaya_id,
+                "name": name,
+                "dairas": [
+                    dict(daira, communes=self.communes_of(daira["id"]))
+                    for daira in self.dairas_of(wilaya_id)
+                ],
+            }
+            for wilaya_id, name in sorted(self.wilayas.items())
+        ]
+        return json.dumps(tree, ensure_ascii=False, separators=(",", ":"))
+
+
+_tree = None
+_lock = threading.Lock()
+
+
+def get_tree():
+    global _tree
+    version = get_version(GEO_VERSION_KEY)  # lue avant la base : une écriture concurrente forcera un rechargement
+    tree = _tree
+    if tree is None or tree.source_version != version:
+        with _lock:
+            if _tree is None or _tree.source_version != version:
+                fresh = GeoTree.from_db()
+                fresh.source_version = version
+                _tree = fresh
+            tree = _tree
+    return tree
+
+
+def geo_version():
+    """Version partagée de l'arbre (cache)."""
+    return get_version(GEO_VERSION_KEY)
+
+
+def loaded_tree(version=None):
+    """L'arbre s'il est chargé dans ce worker et à jour, sinon None (aucune requête SQL).
+
+    `version` : version partagée déjà lue par l'appelant, sinon lue dans le cache.
+    """
+    tree = _tree
+    if tree is not None and tree.source_version == (geo_version() if version is None else version):
+        return tree
+    return None
+
+
+def invalidate(**kwargs):
+    """Force le rechargement de l'arbre au prochain accès, dans tous les workers."""
+    global _tree
+    bump_version(GEO_VERSION_KEY)
+    _tree = None
+
+
+for _model in (Wilaya, Daira, Commune):
+    post_save.connect(invalidate, sender=_model, dispatch_uid=f"geo_invalidate_save_{_model.__name__}")
+    post_delete.connect(invalidate, sender=_model, dispatch_uid=f"geo_invalidate_delete_{_model.__name__}")
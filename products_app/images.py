@@ -0,0 +1,133 @@
+# products_app/images.py
+"""
+Déclinaisons WebP redimensionnées des images produits.
+
+Pour chaque image (`Product.image`, `ProductImage.image`), trois versions
+sont générées à l'upload et rangées à côté de l'originale :
+
+    products/messi.jpg  ->  products/messi.jpg.thumb.webp
+                            products/messi.jpg.card.webp
+                            products/messi.jpg.detail.webp
+
+Le nom complet de l'originale (extension comprise) est conservé : `a.jpg` et
+`a.png` ont des déclinaisons distinctes.
+
+Une version déjà présente sur le stockage n'est jamais recalculée. Les
+gabarits utilisent `{% img_attrs %}` (templatetags/image_tags.py) pour
+servir la bonne taille via `srcset`.
+"""
+
+import logging
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from PIL import Image, ImageOps
+
+from .models import Product, ProductImage
+
+logger = logging.getLogger(__name__)
+
+# nom -> largeur maximale en pixels
+DERIVATIVE_SIZES = {
+    "thumb": 160,
+    "card": 480,
+    "detail": 1000,
+}
+WEBP_QUALITY = 80
+
+# Noms de déclinaisons dont on sait qu'elles existent (évite un accès disque par rendu)
+_known = set()
+
+
+def derivative_name(name, size):
+    return f"{name}.{size}.webp"
+
+
+def is_derivative(name):
+    # Suffixe exact « .<taille>.webp » : une originale « foo.card.jpg » reste une originale
+    return any(name.endswith(f".{size}.webp") for size in DERIVATIVE_SIZES)
+
+
+def derivative_exists(fieldfile, size):
+    name = derivative_name(fieldfile.name, size)
+    if name in _known:
+        return True
+    if fieldfile.storage.exists(name):
+        _known.add(name)
+        return True
+    return False
+
+
+def generate_derivatives(fieldfile, force=False):
+    """Crée les déclinaisons manquantes ; retourne le nombre de fichiers écrits."""
+    if not fieldfile or is_derivative(fieldfile.name):
+        return 0
+    storage = fieldfile.storage
+    missing = [size for size in DERIVATIVE_SIZES if force or not derivative_exists(fieldfile, size)]
+    if not missing:
+        return 0
+
+    with storage.open(fieldfile.name, "rb") as f:
+        original = ImageOps.exif_transpose(Image.open(f))
+        original.load()
+    if original.mode not in ("RGB", "RGBA"):
+        original = original.convert("RGBA")
+
+    written = 0
+    for size in missing:
+        width = DERIVATIVE_SIZES[size]
+        image = original.copy()
+        image.thumbnail((width, width * 4), Image.LANCZOS)
+        buffer = BytesIO()
+        image.save(buffer, "WEBP", quality=WEBP_QUALITY, method=4)
+        name = derivative_name(fieldfile.name, size)
+        if storage.exists(name):
+            storage.delete(name)
+        storage.save(name, ContentFile(buffer.getvalue()))
+        _known.add(name)
+        written += 1
+    return written
+
+
+def delete_derivatives(name, storage):
+    if not name:
+        return
+    for size in DERIVATIVE_SIZES:
+        derivative = derivative_name(name, size)
+        _known.discard(derivative)
+        if storage.exists(derivative):
+            storage.delete(derivative)
+
+
+def _safe_generate(fieldfile):
+    try:
+        generate_derivatives(fieldfile)
+    except (OSError, ValueError) as exc:
+        # Une image illisible ne doit pas bloquer l'enregistrement du produit
+        logger.warning("Déclinaisons impossibles pour %s : %s", fieldfile.name, exc)
+
+
+# 🔹 Génération à l'upload, suppression avec l'originale
+@receiver(post_save, sender=Product)
+def product_image_derivatives(sender, instance, **kwargs):
+    _safe_generate(instance.image)
+
+
+@receiver(post_save, sender=ProductImage)
+def gallery_image_derivatives(sender, instance, **kwargs):
+    _safe_generate(instance.image)
+
+
+@receiver(pre_delete, sender=Product)
+@receiver(pre_delete, sender=ProductImage)
+def remember_image_name(sender, instance, **kwargs):
+    # Le post_delete de models.py efface l'originale (et vide `image.name`) avant le nôtre
+    instance._derivatives_source = instance.image.name if instance.image else None
+
+
+@receiver(post_delete, sender=Product)
+@receiver(post_delete, sender=ProductImage)
+def delete_image_derivatives(sender, instance, **kwargs):
+    delete_derivatives(getattr(instance, "_derivatives_source", None), instance.image.storage)
@@ -0,0 +1,97 @@
+import re
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, NotSupportedError, connections
+from products_app.exports import filter_orders
+from products_app.models import (
+    Cart, CartItem, Commune, DailyProductSales, DailyWilayaSales, Daira, Order, OrderItem, Product, ProductImage,
+    ProductNeighbor,
+)
+
+# (nom, queryset, parcours complet attendu)
+# Chaque nouvelle requête fréquente d'une vue doit être ajoutée ici.
+HOT_QUERIES = [
+    ("catalogue : page keyset", lambda: Product.objects.filter(is_active=True, id__gt=0).order_by('id')[:13], False),
+    ("catalogue : fiche produit", lambda: Product.objects.filter(id=1), False),
+    ("catalogue : images d'une page", lambda: ProductImage.objects.filter(product_id__in=[1, 2, 3]), False),
+    ("catalogue : image principale", lambda: ProductImage.objects.filter(product_id=1, is_main=True), False),
+    ("catalogue : recommandations", lambda: ProductNeighbor.objects.filter(product_id=1).order_by('-score', 'neighbor_id')[:20], False),
+    ("recherche : construction de l'index", lambda: Product.objects.filter(is_active=True).only('id', 'name', 'price', 'image'), True),
+    ("panier : panier du client", lambda: Cart.objects.filter(user_id=1), False),
+    ("panier : lignes", lambda: CartItem.objects.filter(cart_id=1), False),
+    ("checkout : clé d'idempotence", lambda: Order.objects.filter(user_id=1, idempotency_key='x'), False),
+    ("historique : commandes du client", lambda: Order.objects.filter(user_id=1).order_by('-created_at', '-id')[:20], False),
+    ("historique : lignes des commandes", lambda: OrderItem.objects.filter(order_id__in=[1, 2, 3]), False),
+    ("admin : commandes récentes", lambda: Order.objects.order_by('-created_at', '-id')[:50], False),
+    ("admin : filtre statut", lambda: Order.objects.filter(status='pending').order_by('-created_at', '-id')[:50], False),
+    ("admin : filtre wilaya", lambda: Order.objects.filter(wilaya_id=16).order_by('-created_at', '-id')[:50], False),
+    ("admin : filtre période", lambda: filter_orders(
+        Order.objects.all(), {'date_from': '2025-01-01', 'date_to': '2025-01-31'}
+    ).order_by('-created_at', '-id')[:50], False),
+    ("ventes : agrégats jour × wilaya", lambda: DailyWilayaSales.objects.filter(day__gte='2025-01-01'), False),
+    ("ventes : agrégats jour × produit", lambda: DailyProductSales.objects.filter(day__gte='2025-01-01'), False),
+    ("géo : dairas d'une wilaya", lambda: Daira.objects.filter(wilaya_id=16), False),
+    ("géo : communes d'une daira", lambda: Commune.objects.filter(daira_id=1), False),
+    ("export : toutes les commandes", lambda: Order.objects.order_by('id'), True),
+]
+
+# Motifs de parcours complet / de tri hors index dans le plan, par moteur
+FULL_SCAN_PATTERNS = {
+    'sqlite': re.compile(r'\bSCAN (?!CONSTANT ROW)(\S+)(?!.*\bUSING\b)'),
+    'postgresql': re.compile(r'\bSeq Scan on (\S+)'),
+    'mysql': re.compile(r'\btype: ALL\b|\|\s*ALL\s*\|'),
+}
+SORT_PATTERNS = {
+    'sqlite': re.compile(r'USE TEMP B-TREE FOR ORDER BY'),
+    'postgresql': re.compile(r'^\s*(->\s*)?Sort\b', re.MULTILINE),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Exécute EXPLAIN sur les requêtes fréquentes des vues (HOT_QUERIES) et signale les "
+        "parcours complets de table et les tris hors index. Code de sortie non nul si un "
+        "parcours complet inattendu est trouvé. À lancer sur une base remplie (generate_fake_shop)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS, help="Alias de la base à auditer")
+        parser.add_argument('--verbose-plans', action='store_true', help="Affiche le plan complet de chaque requête")
+        parser.add_argument('--warn-only', action='store_true', help="Ne jamais échouer, seulement signaler")
+
+    def handle(self, *args, **options):
+        alias = options['database']
+        vendor = connections[alias].vendor
+        scan_pattern = FULL_SCAN_PATTERNS.get(vendor)
+        sort_pattern = SORT_PATTERNS.get(vendor)
+        if scan_pattern is None:
+            self.stdout.write(self.style.WARNING(
+                f"Moteur « {vendor} » : plans affichés sans analyse automatique."
+            ))
+
+        failures = []
+        for name, build, scan_expected in HOT_QUERIES:
+            try:
+                plan = build().using(alias).explain()
+            except (NotSupportedError, DatabaseError, NotImplementedError) as exc:
+                # djongo/MongoDB : pas d'EXPLAIN via l'ORM — auditer une base SQL (réplique, banc)
+                raise CommandError(f"EXPLAIN indisponible sur « {alias} » ({vendor}) : {exc}")
+
+            scans = sorted(set(scan_pattern.findall(plan))) if scan_pattern else []
+            sorts = bool(sort_pattern and sort_pattern.search(plan))
+            if scans and not scan_expected:
+                status = self.style.ERROR(f"PARCOURS COMPLET : {', '.join(scans)}")
+                failures.append(name)
+            elif scans:
+                status = self.style.WARNING("parcours complet (attendu)")
+            elif sorts:
+                status = self.style.WARNING("tri hors index")
+            else:
+                status = self.style.SUCCESS("ok")
+            self.stdout.write(f"{name:<40} {status}")
+            if options['verbose_plans'] or (scans and not scan_expected):
+                for line in plan.splitlines():
+                    self.stdout.write(f"    {line}")
+
+        if failures and not options['warn_only']:
+            raise CommandError(f"{len(failures)} requête(s) en parcours complet : {', '.join(failures)}")
+        self.stdout.write(self.style.SUCCESS(f"{len(HOT_QUERIES)} requête(s) auditée(s)."))
@@ -0,0 +1,32 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+from products_app.sales import rebuild_sales_rollups
+
+
+class Command(BaseCommand):
+    help = (
+        "Reconstruit les agrégats de ventes (DailyWilayaSales, DailyProductSales) à partir des "
+        "commandes, par agrégations groupées. À lancer une fois après la migration, puis après "
+        "des écritures qui contournent les signaux (update(), bulk_create, SQL direct)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', help="Ne reconstruire qu'à partir de ce jour (AAAA-MM-JJ)")
+        parser.add_argument('--batch-size', type=int, default=2000, help="Lignes insérées par lot")
+
+    def handle(self, *args, **options):
+        since = None
+        if options['since']:
+            try:
+                since = parse_date(options['since'])
+            except ValueError:
+                since = None
+            if since is None:
+                raise CommandError("--since attend une date AAAA-MM-JJ.")
+        started = time.perf_counter()
+        wilaya_rows, product_rows = rebuild_sales_rollups(since=since, batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"{wilaya_rows} ligne(s) jour × wilaya, {product_rows} ligne(s) jour × produit "
+            f"en {time.perf_counter() - started:.1f} s."
+        ))
@@ -0,0 +1,91 @@
+import json
+import subprocess
+import time
+
+import django
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from products_app import benchmark
+
+
+class Command(BaseCommand):
+    help = (
+        "Banc de performance : recrée une base SQLite, la remplit (volumes configurables, "
+        "graine fixe) puis mesure p50/p95, débit et requêtes SQL des pages principales. "
+        "Résultat en JSON pour comparer deux commits. "
+        "Usage : manage.py benchmark --settings=myshop.settings_bench"
+    )
+
+    def add_arguments(self, parser):
+        for key, default in benchmark.DEFAULT_VOLUMES.items():
+            parser.add_argument(f"--{key.replace('_', '-')}", type=int, default=default)
+        parser.add_argument('--seed', type=int, default=42, help="Graine des données générées")
+        parser.add_argument('--iterations', type=int, default=50, help="Requêtes mesurées par scénario et par thread")
+        parser.add_argument('--warmup', type=int, default=5, help="Requêtes d'échauffement non mesurées")
+        parser.add_argument('--concurrency', type=int, default=1, help="Nombre de clients simultanés (threads)")
+        parser.add_argument(
+            '--scenario', action='append', dest='scenarios',
+            choices=[s.name for s in benchmark.SCENARIOS], help="Limite aux scénarios donnés (répétable)",
+        )
+        parser.add_argument('--output', help="Fichier JSON de sortie (par défaut : sortie standard)")
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError(
+                "Le banc efface et remplit la base : il ne tourne que sur SQLite "
+                "(--settings=myshop.settings_bench)."
+            )
+
+        volumes = {key: options[key] for key in benchmark.DEFAULT_VOLUMES}
+        started = time.perf_counter()
+        call_command('migrate', verbosity=0, interactive=False)
+        call_command('flush', verbosity=0, interactive=False)
+        ctx = benchmark.seed(volumes, seed=options['seed'])
+        seeded = time.perf_counter() - started
+        self.stderr.write(f"Base remplie en {seeded:.1f} s ({volumes['products']} produits, {volumes['orders']} commandes).")
+
+        def progress(name, result):
+            self.stderr.write(
+                f"  {name:<28} p50 {result.get('p50_ms', 0):>8.1f} ms  p95 {result.get('p95_ms', 0):>8.1f} ms  "
+                f"SQL {result.get('queries', {}).get('max', 0):>4}"
+            )
+
+        results = benchmark.run(
+            ctx, names=options['scenarios'], iterations=options['iterations'],
+            warmup=options['warmup'], concurrency=options['concurrency'], progress=progress,
+        )
+        report = {
+            "meta": {
+                "commit": self._git_commit(),
+                "date": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+                "django": django.get_version(),
+                "database": settings.DATABASES['default']['ENGINE'],
+                "seed": options['seed'],
+                "volumes": volumes,
+                "iterations": options['iterations'],
+                "warmup": options['warmup'],
+                "concurrency": options['concurrency'],
+                "seed_seconds": round(seeded, 2),
+            },
+            "scenarios": results,
+        }
+        payload = json.dumps(report, indent=2, ensure_ascii=False)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as fh:
+                fh.write(payload + "\n")
+            self.stderr.write(self.style.SUCCESS(f"Résultats écrits dans {options['output']}"))
+        else:
+            self.stdout.write(payload)
+
+    @staticmethod
+    def _git_commit():
+        try:
+            return subprocess.run(
+                ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+                capture_output=True, text=True, check=True,
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
@@ -0,0 +1,34 @@
+import time
+from django.core.management.base import BaseCommand
+from products_app.images import generate_derivatives
+from products_app.models import Product, ProductImage
+
+
+class Command(BaseCommand):
+    help = "Génère les déclinaisons WebP (thumb, card, detail) manquantes pour les images produits existantes"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help="Régénère aussi les déclinaisons déjà présentes")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        images = errors = written = 0
+        sources = [
+            Product.objects.exclude(image='').exclude(image__isnull=True).values_list('image', flat=True),
+            ProductImage.objects.exclude(image='').values_list('image', flat=True),
+        ]
+        field = ProductImage._meta.get_field('image')
+        for names in sources:
+            for name in names.iterator():
+                fieldfile = field.attr_class(None, field, name)
+                images += 1
+                try:
+                    written += generate_derivatives(fieldfile, force=options['force'])
+                except (OSError, ValueError) as exc:
+                    errors += 1
+                    self.stderr.write(f"{name} : {exc}")
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"{images} image(s) traitée(s), {written} déclinaison(s) écrite(s), {errors} erreur(s) en {elapsed:.1f} s."
+        ))
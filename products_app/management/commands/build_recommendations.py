@@ -0,0 +1,34 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from products_app.cache import bump_catalog_version
+from products_app.recommendations import TOP_K, rebuild_recommendations, refresh_pending_neighbors
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalcule les recommandations « souvent achetés ensemble » (ProductNeighbor) à partir de "
+        "toutes les commandes : une auto-jointure groupée sur les lignes, puis les TOP_K meilleurs "
+        "voisins de chaque produit insérés par lots. Avec --pending, ne recalcule que les produits "
+        "des commandes passées depuis le dernier passage (à lancer périodiquement, par cron)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top-k', type=int, default=TOP_K, help="Voisins conservés par produit")
+        parser.add_argument('--batch-size', type=int, default=5000, help="Lignes insérées par lot")
+        parser.add_argument('--pending', action='store_true', help="Ne traiter que la file PendingNeighborUpdate")
+
+    def handle(self, *args, **options):
+        if options['top_k'] <= 0 or options['batch_size'] <= 0:
+            raise CommandError("--top-k et --batch-size doivent être positifs.")
+        started = time.perf_counter()
+        if options['pending']:
+            products, pairs = refresh_pending_neighbors(top_k=options['top_k'], batch_size=options['batch_size'])
+        else:
+            products, pairs = None, rebuild_recommendations(top_k=options['top_k'], batch_size=options['batch_size'])
+        if products != 0:
+            # Les fiches produit en cache (visiteurs anonymes) affichent les nouvelles recommandations
+            bump_catalog_version()
+        scope = "" if products is None else f"{products} produit(s) recalculé(s), "
+        self.stdout.write(self.style.SUCCESS(
+            f"{scope}{pairs} paire(s) de produits enregistrée(s) en {time.perf_counter() - started:.1f} s."
+        ))
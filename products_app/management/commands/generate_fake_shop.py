@@ -0,0 +1,62 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from products_app.cache import bump_catalog_version
+from products_app.fake_shop import DEFAULT_PASSWORD, FakeShopGenerator
+from products_app.recommendations import rebuild_recommendations
+from products_app.sales import rebuild_sales_rollups
+
+
+class Command(BaseCommand):
+    help = (
+        "Génère un jeu de données réaliste et reproductible (produits, images, clients/profils, "
+        "commandes et lignes) par lots bulk_create, sans signaux. Les adresses suivent la "
+        "géographie chargée par load_algeria. Les données sont ajoutées à celles existantes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=10000)
+        parser.add_argument('--images-per-product', type=int, default=3)
+        parser.add_argument('--users', type=int, default=10000)
+        parser.add_argument('--orders', type=int, default=100000)
+        parser.add_argument('--items-per-order', type=int, default=4, help="Nombre maximal de lignes par commande")
+        parser.add_argument('--days', type=int, default=365, help="Période couverte par les commandes (jours)")
+        parser.add_argument('--seed', type=int, default=42, help="Graine : mêmes options + même base = mêmes données")
+        parser.add_argument('--batch-size', type=int, default=5000, help="Lignes insérées par lot")
+        parser.add_argument('--password', default=DEFAULT_PASSWORD, help="Mot de passe de tous les clients générés")
+
+    def handle(self, *args, **options):
+        self._step = {}
+        generator = FakeShopGenerator(seed=options['seed'], batch_size=options['batch_size'], progress=self.progress)
+        started = time.perf_counter()
+
+        steps = [
+            ('products', lambda: generator.products(options['products'], options['images_per_product'])),
+            ('users', lambda: generator.users(options['users'], options['password'])),
+            ('orders', lambda: generator.orders(options['orders'], options['items_per_order'], options['days'])),
+        ]
+        for key, run in steps:
+            if options[key] <= 0:
+                continue
+            step_started = time.perf_counter()
+            try:
+                created = run()
+            except ValueError as exc:
+                raise CommandError(str(exc))
+            elapsed = time.perf_counter() - step_started
+            self.stdout.write(f"{key:<9} {created:>10} lignes en {elapsed:6.1f} s ({created / max(elapsed, 1e-9):,.0f}/s)")
+
+        generator.reset_sequences()
+        # bulk_create n'envoie pas de signal : invalide explicitement les pages catalogue en cache
+        bump_catalog_version()
+        # ... ni de mise à jour des agrégats de ventes et des recommandations : reconstruits depuis les commandes
+        if options['orders'] > 0:
+            rebuild_sales_rollups()
+            rebuild_recommendations()
+        self.stdout.write(self.style.SUCCESS(f"Jeu de données généré en {time.perf_counter() - started:.1f} s."))
+
+    def progress(self, label, done, total):
+        # Une ligne tous les 10 % pour les gros volumes
+        step = done * 10 // total
+        if step > self._step.get(label, 0) and done < total:
+            self._step[label] = step
+            self.stdout.write(f"  {label} : {done}/{total}")
@@ -1,53 +1,162 @@
 import json
 import os
-from django.core.management.base import BaseCommand
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
 from products_app.models import Wilaya, Daira, Commune
+from products_app import geo
 from django.conf import settings
 
+
+def _key(name):
+    # Clé naturelle : insensible aux espaces superflus et à la casse
+    return " ".join(name.split()).casefold()
+
+
 class Command(BaseCommand):
-    help = 'Charge les données des wilayas, dairas et communes depuis algeria_cities.json'
+    help = (
+        "Charge les wilayas, dairas et communes depuis algeria_cities.json. "
+        "Chargement incrémental : seules les lignes absentes sont insérées (bulk_create) "
+        "et les noms modifiés mis à jour (bulk_update), clés naturelles à l'appui. "
+        "Les données déjà référencées par des commandes ne sont jamais supprimées."
+    )
 
-    def handle(self, *args, **options):
-        # Chemin absolu vers le fichier JSON
-        file_path = os.path.join(settings.BASE_DIR, 'products_app', 'algeria_cities.json')
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--file',
+            default=os.path.join(settings.BASE_DIR, 'products_app', 'algeria_cities.json'),
+            help="Chemin du fichier JSON (par défaut : products_app/algeria_cities.json)",
+        )
+        parser.add_argument('--dry-run', action='store_true', help="Affiche les changements sans rien écrire")
+        parser.add_argument('--batch-size', type=int, default=500, help="Taille des lots bulk_create/bulk_update")
+        parser.add_argument(
+            '--prune', action='store_true',
+            help="Supprime les lignes absentes du fichier et non utilisées par une commande",
+        )
 
+    def handle(self, *args, **options):
+        file_path = options['file']
         if not os.path.exists(file_path):
-            self.stdout.write(self.style.ERROR(f"Fichier non trouvé : {file_path}"))
-            return
+            raise CommandError(f"Fichier non trouvé : {file_path}")
 
-        # Charger le JSON
-        with open(file_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
+        self.dry_run = options['dry_run']
+        self.batch_size = options['batch_size']
+        self.report = []
+        started = time.perf_counter()
+
+        wilayas, dairas, communes = self.read_file(file_path)
+
+        with transaction.atomic():
+            wilaya_ids = self.sync_wilayas(wilayas)
+            daira_ids = self.sync_dairas(dairas, wilaya_ids)
+            self.sync_communes(communes, daira_ids)
+            if options['prune']:
+                self.prune(wilayas, dairas, communes)
 
-        # Supprimer les anciennes données
-        Commune.objects.all().delete()
-        Daira.objects.all().delete()
-        Wilaya.objects.all().delete()
+        if not self.dry_run:
+            geo.invalidate()
 
-        wilaya_cache = {}  # Pour éviter les doublons
-        daira_cache = {}   # Clé: wilaya_name + daira_name
+        for label, created, updated, unchanged, deleted, elapsed in self.report:
+            self.stdout.write(
+                f"{label:<10} créées: {created:>5}  mises à jour: {updated:>5}  "
+                f"inchangées: {unchanged:>5}  supprimées: {deleted:>5}  ({elapsed * 1000:.0f} ms)"
+            )
+        total = time.perf_counter() - started
+        if self.dry_run:
+            self.stdout.write(self.style.WARNING(f"Simulation terminée en {total:.2f} s : aucune donnée écrite."))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Données d’Algérie synchronisées en {total:.2f} s."))
+
+    # -------------------------
+    # Lecture du fichier
+    # -------------------------
+    def read_file(self, file_path):
+        """Retourne trois dicts {clé naturelle: nom} dédupliqués, dans l'ordre du fichier."""
+        with open(file_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
 
+        wilayas, dairas, communes = {}, {}, {}
         for entry in data:
             wilaya_name = entry.get('wilaya_name').strip()
             daira_name = entry.get('daira_name').strip()
             commune_name = entry.get('commune_name').strip()
+            w, d, c = _key(wilaya_name), _key(daira_name), _key(commune_name)
+            wilayas.setdefault(w, wilaya_name)
+            dairas.setdefault((w, d), daira_name)
+            communes.setdefault((w, d, c), commune_name)
+        return wilayas, dairas, communes
+
+    # -------------------------
+    # Synchronisation par niveau
+    # -------------------------
+    def _sync(self, label, model, wanted, existing, build):
+        """Compare `wanted` {clé: nom} aux lignes `existing` {clé: instance}.
+
+        Insère les clés absentes via `build(clé, nom)` et corrige les noms
+        qui ne diffèrent que par la casse ou les espaces.
+        """
+        started = time.perf_counter()
+        to_create, to_update = [], []
+        for key, name in wanted.items():
+            obj = existing.get(key)
+            if obj is None:
+                to_create.append(build(key, name))
+            elif obj.name != name:
+                obj.name = name
+                to_update.append(obj)
+
+        if not self.dry_run:
+            model.objects.bulk_create(to_create, batch_size=self.batch_size)
+            model.objects.bulk_update(to_update, ['name'], batch_size=self.batch_size)
+
+        unchanged = len(wanted) - len(to_create) - len(to_update)
+        self.report.append([label, len(to_create), len(to_update), unchanged, 0, time.perf_counter() - started])
+
+    def _wilaya_map(self):
+        return {_key(w.name): w for w in Wilaya.objects.only('id', 'name')}
+
+    def _daira_map(self):
+        dairas = Daira.objects.select_related('wilaya').only('id', 'name', 'wilaya__name')
+        return {(_key(d.wilaya.name), _key(d.name)): d for d in dairas}
+
+    def _commune_map(self):
+        communes = Commune.objects.select_related('daira__wilaya').only('id', 'name', 'daira__name', 'daira__wilaya__name')
+        return {(_key(c.daira.wilaya.name), _key(c.daira.name), _key(c.name)): c for c in communes}
+
+    def sync_wilayas(self, wilayas):
+        self._sync('Wilayas', Wilaya, wilayas, self._wilaya_map(), lambda key, name: Wilaya(name=name))
+        return {key: w.id for key, w in self._wilaya_map().items()}
+
+    def sync_dairas(self, dairas, wilaya_ids):
+        self._sync(
+            'Dairas', Daira, dairas, self._daira_map(),
+            lambda key, name: Daira(name=name, wilaya_id=wilaya_ids.get(key[0])),
+        )
+        return {key: d.id for key, d in self._daira_map().items()}
+
+    def sync_communes(self, communes, daira_ids):
+        self._sync(
+            'Communes', Commune, communes, self._commune_map(),
+            lambda key, name: Commune(name=name, daira_id=daira_ids.get(key[:2])),
+        )
 
-            # Créer ou récupérer la Wilaya
-            if wilaya_name not in wilaya_cache:
-                wilaya = Wilaya.objects.create(name=wilaya_name)
-                wilaya_cache[wilaya_name] = wilaya
-            else:
-                wilaya = wilaya_cache[wilaya_name]
-
-            # Créer ou récupérer la Daira
-            daira_key = f"{wilaya_name}_{daira_name}"
-            if daira_key not in daira_cache:
-                daira = Daira.objects.create(name=daira_name, wilaya=wilaya)
-                daira_cache[daira_key] = daira
-            else:
-                daira = daira_cache[daira_key]
-
-            # Créer la Commune
-            Commune.objects.create(name=commune_name, daira=daira)
-
-        self.stdout.write(self.style.SUCCESS('Toutes les données d’Algérie ont été chargées avec succès !'))
+    # -------------------------
+    # Nettoyage
+    # -------------------------
+    def prune(self, wilayas, dairas, communes):
+        """Supprime les lignes absentes du fichier, sauf celles utilisées par une commande."""
+        levels = [
+            ('Communes', Commune, self._commune_map(), communes, {}),
+            ('Dairas', Daira, self._daira_map(), dairas, {'commune__isnull': True}),
+            ('Wilayas', Wilaya, self._wilaya_map(), wilayas, {'daira__isnull': True}),
+        ]
+        for label, model, existing, wanted, no_children in levels:
+            started = time.perf_counter()
+            stale = [obj.id for key, obj in existing.items() if key not in wanted]
+            unused = model.objects.filter(id__in=stale, order__isnull=True, **no_children)
+            deleted = unused.count() if stale else 0
+            if deleted and not self.dry_run:
+                unused.delete()
+            row = next(r for r in self.report if r[0] == label)
+            row[4] = deleted
+            row[5] += time.perf_counter() - started
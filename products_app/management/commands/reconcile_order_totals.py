@@ -0,0 +1,68 @@
+from decimal import Decimal
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import DecimalField, F, Sum
+from products_app.models import Order, OrderItem
+
+ZERO = Decimal('0.00')
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalcule Order.total et Order.items_count à partir des lignes (une seule agrégation "
+        "groupée par commande) et corrige les écarts par lots bulk_update. À lancer après des "
+        "écritures qui contournent les signaux (update(), bulk_create, SQL direct)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000, help="Commandes lues et corrigées par lot")
+        parser.add_argument('--dry-run', action='store_true', help="Compter les écarts sans rien écrire")
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        if batch_size <= 0:
+            raise CommandError("--batch-size doit être positif.")
+
+        # Une seule requête groupée, triée par commande, lue en flux et fusionnée avec les
+        # commandes parcourues par lots d'id croissants (pas d'OFFSET, pas de requête par commande)
+        sums = OrderItem.objects.values('order_id').annotate(
+            line_total=Sum(F('price') * F('quantity'), output_field=DecimalField(max_digits=12, decimal_places=2)),
+            line_count=Sum('quantity'),
+        ).order_by('order_id').iterator()
+        current = next(sums, None)
+
+        checked = drifted = 0
+        last_id = 0
+        while True:
+            orders = list(
+                Order.objects.filter(id__gt=last_id).order_by('id').only('id', 'total', 'items_count')[:batch_size]
+            )
+            if not orders:
+                break
+            last_id = orders[-1].id
+
+            stale = []
+            for order in orders:
+                # Lignes orphelines (commande supprimée entre-temps) : ignorées
+                while current is not None and current['order_id'] < order.id:
+                    current = next(sums, None)
+                if current is not None and current['order_id'] == order.id:
+                    total, count = current['line_total'] or ZERO, current['line_count'] or 0
+                else:
+                    total, count = ZERO, 0
+                if order.total != total or order.items_count != count:
+                    order.total, order.items_count = total, count
+                    stale.append(order)
+            checked += len(orders)
+            drifted += len(stale)
+
+            if stale and not options['dry_run']:
+                with transaction.atomic():
+                    Order.objects.bulk_update(stale, ['total', 'items_count'])
+            if options['verbosity'] >= 2:
+                self.stdout.write(f"  jusqu'à #{last_id} : {checked} vérifiées, {drifted} écart(s)")
+
+        fixed = 0 if options['dry_run'] else drifted
+        self.stdout.write(self.style.SUCCESS(
+            f"{checked} commande(s) vérifiée(s), {drifted} écart(s), {fixed} corrigée(s)."
+        ))
@@ -0,0 +1,287 @@
+# products_app/metrics.py
+"""
+Instrumentation des requêtes : durée, nombre de requêtes SQL et temps SQL par vue.
+
+`MetricsMiddleware` mesure chaque requête HTTP et compte les requêtes SQL via
+`connection.execute_wrapper` (fonctionne aussi avec DEBUG=False). Les mesures
+sont agrégées en mémoire par le worker puis versées, au plus toutes les
+`METRICS_FLUSH_INTERVAL` secondes, dans un petit fichier SQLite local
+(`METRICS_DB_PATH`) partagé par tous les workers Gunicorn de la machine.
+L'endpoint `/metrics` (staff uniquement) lit ce fichier et le rend au format
+texte Prometheus.
+
+Les requêtes SQL plus lentes que `METRICS_SLOW_QUERY_MS` et les requêtes HTTP
+plus lentes que `METRICS_SLOW_REQUEST_MS` sont journalisées (logger
+`products_app.metrics`).
+"""
+
+import logging
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+
+# nom -> (type, aide) ; l'ordre est celui du rendu
+FAMILIES = {
+    "myshop_requests_total": ("counter", "Requêtes HTTP par vue, méthode et statut."),
+    "myshop_request_duration_seconds": ("histogram", "Durée des requêtes HTTP par vue."),
+    "myshop_db_queries_per_request": ("histogram", "Nombre de requêtes SQL par requête HTTP."),
+    "myshop_db_duration_seconds_total": ("counter", "Temps total passé en base par vue."),
+    "myshop_db_slow_queries_total": ("counter", "Requêtes SQL au-dessus du seuil de lenteur."),
+}
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def _labels(**labels):
+    return ",".join(f'{key}="{_escape(value)}"' for key, value in sorted(labels.items()))
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_value(value):
+    return str(int(value)) if float(value).is_integer() else repr(value)
+
+
+def _format_le(bound):
+    return "+Inf" if bound is None else repr(float(bound))
+
+
+# -------------------------
+# Stockage partagé (SQLite)
+# -------------------------
+class MetricsStore:
+    """Compteurs additifs dans un fichier SQLite partagé par les workers."""
+
+    def __init__(self, path):
+        self.path = str(path)
+        self._initialized = False
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+        if not self._initialized:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS samples ("
+                " name TEXT NOT NULL, labels TEXT NOT NULL, le TEXT NOT NULL, value REAL NOT NULL,"
+                " PRIMARY KEY (name, labels, le))"
+            )
+            self._initialized = True
+        conn.execute("PRAGMA synchronous=OFF")
+        return conn
+
+    def add(self, increments):
+        """increments : {(nom, labels, le): valeur} ajoutés atomiquement."""
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.executemany(
+                "INSERT INTO samples (name, labels, le, value) VALUES (?, ?, ?, ?)"
+                " ON CONFLICT (name, labels, le) DO UPDATE SET value = value + excluded.value",
+                [(name, labels, le, value) for (name, labels, le), value in increments.items()],
+            )
+            conn.execute("COMMIT")
+        finally:
+            conn.close()
+
+    def samples(self):
+        conn = self._connect()
+        try:
+            return conn.execute("SELECT name, labels, le, value FROM samples").fetchall()
+        finally:
+            conn.close()
+
+
+# -------------------------
+# Agrégation dans le worker
+# -------------------------
+class MetricsRecorder:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = defaultdict(float)
+        self._last_flush = time.monotonic()
+        self._store = None
+
+    @property
+    def store(self):
+        path = _setting("METRICS_DB_PATH", None)
+        if path is None:
+            return None
+        if self._store is None or self._store.path != str(path):
+            self._store = MetricsStore(path)
+        return self._store
+
+    def _inc(self, name, labels, value=1, le=""):
+        self._pending[(name, labels, le)] += value
+
+    def _observe(self, name, labels, value, buckets):
+        # Tous les seaux sont écrits (même à 0) : Prometheus attend une série complète
+        for bound in buckets:
+            self._inc(f"{name}_bucket", labels, 1 if value <= bound else 0, le=_format_le(bound))
+        self._inc(f"{name}_bucket", labels, le=_format_le(None))
+        self._inc(f"{name}_sum", labels, value)
+        self._inc(f"{name}_count", labels)
+
+    def record(self, view, method, status, duration, queries, db_time, slow_queries, flush=True):
+        view_labels = _labels(view=view)
+        with self._lock:
+            self._inc("myshop_requests_total", _labels(view=view, method=method, status=status))
+            self._observe("myshop_request_duration_seconds", view_labels, duration, DURATION_BUCKETS)
+            self._observe("myshop_db_queries_per_request", view_labels, queries, QUERY_COUNT_BUCKETS)
+            self._inc("myshop_db_duration_seconds_total", view_labels, db_time)
+            if slow_queries:
+                self._inc("myshop_db_slow_queries_total", view_labels, slow_queries)
+        if flush and self.flush_due():
+            self.flush()
+
+    def flush_due(self):
+        return time.monotonic() - self._last_flush >= _setting("METRICS_FLUSH_INTERVAL", 1.0)
+
+    def flush(self):
+        store = self.store
+        with self._lock:
+            pending, self._pending = self._pending, defaultdict(float)
+            self._last_flush = time.monotonic()
+        if not pending or store is None:
+            return
+        try:
+            store.add(pending)
+        except sqlite3.Error as exc:
+            # Base verrouillée ou illisible : on garde les mesures pour le prochain essai
+            logger.warning("Écriture des métriques impossible : %s", exc)
+            with self._lock:
+                for key, value in pending.items():
+                    self._pending[key] += value
+
+    def render(self):
+        """Texte Prometheus de toutes les mesures (tous workers confondus)."""
+        self.flush()
+        store = self.store
+        rows = store.samples() if store is not None else []
+
+        by_family = defaultdict(list)
+        for name, labels, le, value in rows:
+            family = name
+            for suffix in ("_bucket", "_sum", "_count"):
+                if name.endswith(suffix) and name[: -len(suffix)] in FAMILIES:
+                    family = name[: -len(suffix)]
+            by_family[family].append((name, labels, le, value))
+
+        lines = []
+        for family, (kind, help_text) in FAMILIES.items():
+            lines.append(f"# HELP {family} {help_text}")
+            lines.append(f"# TYPE {family} {kind}")
+            samples = sorted(
+                by_family.get(family, ()),
+                key=lambda s: (s[1], s[0], float("inf") if s[2] == "+Inf" else float(s[2] or 0)),
+            )
+            for name, labels, le, value in samples:
+                if le:
+                    labels = f'{labels},le="{le}"' if labels else f'le="{le}"'
+                value = _format_value(value)
+                lines.append(f"{name}{{{labels}}} {value}" if labels else f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+recorder = MetricsRecorder()
+
+
+# -------------------------
+# Middleware
+# -------------------------
+class _QueryTimer:
+    """`execute_wrapper` : compte et chronomètre chaque requête SQL."""
+
+    def __init__(self, slow_threshold):
+        self.count = 0
+        self.duration = 0.0
+        self.slow = 0
+        self.slow_threshold = slow_threshold
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.count += 1
+            self.duration += elapsed
+            if elapsed * 1000 >= self.slow_threshold:
+                self.slow += 1
+                logger.warning("Requête SQL lente (%.1f ms) : %s", elapsed * 1000, sql)
+
+
+class MetricsMiddleware:
+    """Mesure durée, nombre de requêtes SQL et temps SQL de chaque vue."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        timer = _QueryTimer(_setting("METRICS_SLOW_QUERY_MS", 100))
+        start = time.perf_counter()
+        with self._timed_queries(timer):
+            response = self.get_response(request)
+        return self._record(request, response, timer, start)
+
+    async def __acall__(self, request):
+        # Les connexions sont propres à chaque thread : le chronomètre est posé sur celles
+        # du thread où sync_to_async exécute l'ORM pendant cette requête
+        timer = _QueryTimer(_setting("METRICS_SLOW_QUERY_MS", 100))
+        start = time.perf_counter()
+        stack = await sync_to_async(self._timed_queries)(timer)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(stack.close)()
+        # Mesures ajoutées en mémoire ; l'écriture SQLite, si elle est due, se fait hors de la boucle
+        self._record(request, response, timer, start, flush=False)
+        if recorder.flush_due():
+            await sync_to_async(recorder.flush, thread_sensitive=False)()
+        return response
+
+    @staticmethod
+    def _timed_queries(timer):
+        stack = ExitStack()
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(timer))
+        return stack
+
+    @staticmethod
+    def _record(request, response, timer, start, flush=True):
+        duration = time.perf_counter() - start
+        match = getattr(request, "resolver_match", None)
+        # Vue non résolue (404) : une seule étiquette pour borner la cardinalité
+        view = match.view_name if match is not None else "<unresolved>"
+        if duration * 1000 >= _setting("METRICS_SLOW_REQUEST_MS", 1000):
+            logger.warning(
+                "Requête lente %s %s (%s) : %.0f ms, %d requêtes SQL (%.0f ms)",
+                request.method, request.path, view, duration * 1000, timer.count, timer.duration * 1000,
+            )
+        recorder.record(
+            view, request.method, response.status_code, duration,
+            timer.count, timer.duration, timer.slow, flush=flush,
+        )
+        return response
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:45
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def set_main_images(apps, schema_editor):
+    """Garde une seule image principale par produit et remplit Product.main_image."""
+    Product = apps.get_model('products_app', 'Product')
+    ProductImage = apps.get_model('products_app', 'ProductImage')
+    db = schema_editor.connection.alias
+    main_by_product = {}
+    for image_id, product_id in ProductImage.objects.using(db).filter(is_main=True).order_by('id').values_list('id', 'product_id'):
+        main_by_product.setdefault(product_id, image_id)
+    ProductImage.objects.using(db).filter(is_main=True).exclude(id__in=list(main_by_product.values())).update(is_main=False)
+    products = list(Product.objects.using(db).filter(id__in=main_by_product))
+    for product in products:
+        product.main_image_id = main_by_product[product.id]
+    Product.objects.using(db).bulk_update(products, ['main_image'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products_app', '0002_order_idempotency_key'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='main_image',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='products_app.productimage'),
+        ),
+        migrations.RunPython(set_main_images, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='productimage',
+            constraint=models.UniqueConstraint(condition=models.Q(('is_main', True)), fields=('product',), name='unique_main_image_per_product'),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:48
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def copy_cart_products(apps, schema_editor):
+    """Chaque produit de l'ancien M2M Cart.products devient une ligne de quantité 1."""
+    Cart = apps.get_model('products_app', 'Cart')
+    CartItem = apps.get_model('products_app', 'CartItem')
+    Through = Cart.products.through
+    db = schema_editor.connection.alias
+    CartItem.objects.using(db).bulk_create(
+        [CartItem(cart_id=cart_id, product_id=product_id, quantity=1)
+         for cart_id, product_id in Through.objects.using(db).values_list('cart_id', 'product_id').iterator()],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products_app', '0004_product_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CartItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.PositiveIntegerField(default=1)),
+                ('cart', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='items', to='products_app.cart')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='products_app.product')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('cart', 'product'), name='unique_cart_product')],
+            },
+        ),
+        migrations.RunPython(copy_cart_products, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='cart',
+            name='products',
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:06
+
+from django.db import migrations, models
+from django.db.models import F, Sum
+
+
+def backfill_order_totals(apps, schema_editor):
+    """Total et nombre d'articles de chaque commande, en une seule agrégation groupée."""
+    Order = apps.get_model('products_app', 'Order')
+    OrderItem = apps.get_model('products_app', 'OrderItem')
+    db = schema_editor.connection.alias
+    rows = (OrderItem.objects.using(db).values('order_id')
+            .annotate(total=Sum(F('price') * F('quantity')), count=Sum('quantity')).order_by())
+    batch = []
+    for row in rows.iterator():
+        batch.append(Order(id=row['order_id'], total=row['total'], items_count=row['count']))
+        if len(batch) >= 1000:
+            Order.objects.using(db).bulk_update(batch, ['total', 'items_count'])
+            batch = []
+    if batch:
+        Order.objects.using(db).bulk_update(batch, ['total', 'items_count'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products_app', '0006_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='items_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_order_totals, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:29
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products_app', '0010_order_idempotency_key_per_user'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PendingNeighborUpdate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='products_app.product')),
+            ],
+        ),
+    ]
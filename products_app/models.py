@@ -1,7 +1,11 @@
-from django.db import models
+from decimal import Decimal
+from django.db import models, transaction
+from django.db.models import F, Sum, Value
+from django.db.models.functions import Coalesce
 from django.conf import settings   # ✅ utiliser AUTH_USER_MODEL
 from django.db.models.signals import post_delete
 from django.dispatch import receiver
+from django.utils import timezone
 
 # 🔹 Produit
 class Product(models.Model):
@@ -9,6 +13,18 @@ class Product(models.Model):
     price = models.DecimalField(max_digits=8, decimal_places=2)
     image = models.ImageField(upload_to='products/', null=True, blank=True)  # image principale
     is_active = models.BooleanField(default=True)  # ✅ pour soft delete
+    # ✅ Image principale dénormalisée, tenue à jour par ProductImage.save()
+    main_image = models.ForeignKey(
+        'ProductImage', null=True, blank=True, editable=False,
+        on_delete=models.SET_NULL, related_name='+'
+    )
+    updated_at = models.DateTimeField(auto_now=True)  # ✅ touché aussi quand ses images changent
+
+    class Meta:
+        indexes = [
+            # ✅ Catalogue paginé par id sur les seuls produits actifs (index partiel)
+            models.Index(fields=['id'], condition=models.Q(is_active=True), name='product_active_id_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -24,19 +40,63 @@ class ProductImage(models.Model):
     image = models.ImageField(upload_to="products/")
     is_main = models.BooleanField(default=False)  # Indique si c’est l’image principale
 
+    class Meta:
+        constraints = [
+            # ✅ Une seule image principale par produit
+            models.UniqueConstraint(
+                fields=['product'], condition=models.Q(is_main=True), name='unique_main_image_per_product'
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['product', 'is_main'], name='productimage_product_main_idx'),
+        ]
+
     def __str__(self):
         return f"Image de {self.product.name}"
 
-# 🔹 Panier
+    # ✅ Garde Product.main_image cohérent (une seule image principale, même depuis un inline)
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            if self.is_main:
+                ProductImage.objects.filter(product_id=self.product_id, is_main=True).exclude(pk=self.pk).update(is_main=False)
+            super().save(*args, **kwargs)
+            changes = {'updated_at': timezone.now()}
+            if self.is_main:
+                changes['main_image'] = self
+            elif Product.objects.filter(pk=self.product_id, main_image=self).exists():
+                changes['main_image'] = None
+            Product.objects.filter(pk=self.product_id).update(**changes)
+
+# 🔹 Panier (persistant pour les utilisateurs connectés)
 class Cart(models.Model):
     user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)  # ✅ corrigé
-    products = models.ManyToManyField(Product, blank=True)
 
     def __str__(self):
         return f"Panier de {self.user.username}"
 
     def total_price(self):
-        return sum(product.price for product in self.products.filter(is_active=True))  # seulement actifs
+        # ✅ calculé par la base, seulement les produits actifs
+        return self.items.filter(product__is_active=True).aggregate(
+            total=Coalesce(
+                Sum(F('product__price') * F('quantity'), output_field=models.DecimalField(max_digits=12, decimal_places=2)),
+                Value(Decimal('0.00')),
+                output_field=models.DecimalField(max_digits=12, decimal_places=2),
+            )
+        )['total']
+
+# 🔹 Lignes du panier
+class CartItem(models.Model):
+    cart = models.ForeignKey(Cart, related_name="items", on_delete=models.CASCADE)
+    product = models.ForeignKey(Product, on_delete=models.CASCADE)
+    quantity = models.PositiveIntegerField(default=1)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['cart', 'product'], name='unique_cart_product'),
+        ]
+
+    def __str__(self):
+        return f"{self.quantity} x {self.product.name}"
 
 # 🔹 Commande
 class Order(models.Model):
@@ -55,8 +115,26 @@ class Order(models.Model):
     commune = models.ForeignKey('Commune', on_delete=models.PROTECT, null=True, blank=True)
     address_details = models.TextField(default="Adresse détaillée non définie")
     created_at = models.DateTimeField(auto_now_add=True)
-    total = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    total = models.DecimalField(max_digits=10, decimal_places=2, default=0)  # ✅ tenu à jour avec items_count (products_app.orders)
+    items_count = models.PositiveIntegerField(default=0, editable=False)  # ✅ somme des quantités des lignes
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    idempotency_key = models.CharField(max_length=64, null=True, blank=True, editable=False)  # ✅ anti double soumission (unique par client)
+
+    class Meta:
+        constraints = [
+            # ✅ Une clé d'idempotence identifie une soumission d'un client donné
+            models.UniqueConstraint(fields=['user', 'idempotency_key'], name='unique_order_user_idempotency_key'),
+        ]
+        indexes = [
+            # ✅ Historique d'un client, du plus récent au plus ancien
+            models.Index(fields=['user', '-created_at'], name='order_user_created_idx'),
+            # ✅ Tableau de bord admin : tri (created_at, id), filtres statut / wilaya
+            models.Index(fields=['-created_at', '-id'], name='order_created_id_idx'),
+            models.Index(fields=['status', '-created_at', '-id'], name='order_status_created_idx'),
+            models.Index(fields=['wilaya', '-created_at', '-id'], name='order_wilaya_created_idx'),
+            # ✅ Commandes à traiter : petit index partiel
+            models.Index(fields=['-created_at'], condition=models.Q(status='pending'), name='order_pending_created_idx'),
+        ]
 
     def __str__(self):
         return f"Commande {self.id} - {self.user.username}"
@@ -75,6 +153,64 @@ class OrderItem(models.Model):
     def subtotal(self):
         return self.price * self.quantity
 
+# 🔹 Produits souvent achetés ensemble (top-K par produit, tenu à jour par products_app.recommendations)
+class ProductNeighbor(models.Model):
+    product = models.ForeignKey('Product', on_delete=models.CASCADE, related_name='neighbors')
+    neighbor = models.ForeignKey('Product', on_delete=models.CASCADE, related_name='+')
+    score = models.PositiveIntegerField(default=0)  # commandes contenant les deux produits
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'neighbor'], name='unique_product_neighbor'),
+        ]
+        indexes = [
+            # ✅ Fiche produit : voisins d'un produit par score décroissant, sans tri
+            models.Index(fields=['product', '-score', 'neighbor'], name='productneighbor_score_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} -> {self.neighbor_id} ({self.score})"
+
+
+# 🔹 Produits dont les voisins sont à recalculer (file vidée par build_recommendations --pending)
+class PendingNeighborUpdate(models.Model):
+    product = models.ForeignKey('Product', on_delete=models.CASCADE, related_name='+')
+
+    def __str__(self):
+        return f"{self.product_id} (voisins à recalculer)"
+
+# 🔹 Agrégats de ventes (tenus à jour par products_app.sales, reconstruits par backfill_sales_rollups)
+class DailyWilayaSales(models.Model):
+    day = models.DateField()
+    wilaya = models.ForeignKey('Wilaya', on_delete=models.CASCADE, null=True, blank=True)
+    status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES)
+    orders_count = models.IntegerField(default=0)
+    items_count = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'wilaya', 'status'], name='unique_daily_wilaya_sales'),
+        ]
+
+    def __str__(self):
+        return f"{self.day} - {self.wilaya_id} - {self.status}"
+
+class DailyProductSales(models.Model):
+    day = models.DateField()
+    product = models.ForeignKey('Product', on_delete=models.CASCADE)
+    status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES)
+    quantity = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'product', 'status'], name='unique_daily_product_sales'),
+        ]
+
+    def __str__(self):
+        return f"{self.day} - {self.product_id} - {self.status}"
+
 # 🔹 Wilayas, Dairas et Communes (Algérie)
 class Wilaya(models.Model):
     name = models.CharField(max_length=100)
@@ -98,6 +234,7 @@ class Commune(models.Model):
 def delete_product_image_file(sender, instance, **kwargs):
     if instance.image:
         instance.image.delete(False)
+    Product.objects.filter(pk=instance.product_id).update(updated_at=timezone.now())
 
 @receiver(post_delete, sender=Product)
 def delete_product_main_image_file(sender, instance, **kwargs):
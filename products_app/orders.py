@@ -0,0 +1,102 @@
+# products_app/orders.py
+"""
+Enregistrement des commandes.
+
+`place_order` écrit la commande et toutes ses lignes dans une seule
+transaction (un INSERT pour la commande, un `bulk_create` pour les articles)
+et stocke le total calculé. Une clé d'idempotence fournie par le client
+permet de rejouer une soumission (double clic, XHR + formulaire) sans créer
+de doublon : la commande déjà enregistrée est renvoyée.
+
+`Order.total` et `Order.items_count` sont ensuite tenus à jour à chaque
+modification d'un `OrderItem` (signaux `post_save` / `post_delete`) par un
+seul UPDATE calculé en base : les lectures n'ont jamais besoin de parcourir
+les lignes pour afficher un total. `reconcile_order_totals` corrige les
+écarts laissés par des écritures sans signal (`update()`, `bulk_create`).
+"""
+
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import DecimalField, F, OuterRef, PositiveIntegerField, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Order, OrderItem
+from .recommendations import queue_neighbor_updates
+from .sales import record_order_lines
+
+ORDER_FIELDS = ("full_name", "email", "phone", "address_details")
+GEO_FIELDS = ("wilaya", "daira", "commune")  # identifiants validés par CheckoutForm
+
+
+def find_order(user, idempotency_key):
+    if not idempotency_key:
+        return None
+    return Order.objects.filter(user=user, idempotency_key=idempotency_key).first()
+
+
+def place_order(user, cart, data, idempotency_key=None):
+    """Crée la commande à partir d'un `CartService` résolu.
+
+    Retourne `(order, created)` ; `created` vaut False si la clé
+    d'idempotence correspond à une commande existante.
+    """
+    existing = find_order(user, idempotency_key)
+    if existing is not None:
+        return existing, False
+
+    try:
+        with transaction.atomic():
+            order = Order(
+                user=user,
+                total=cart.total,
+                items_count=sum(line["qty"] for line in cart.lines),
+                idempotency_key=idempotency_key or None,
+                **{field: data[field] for field in ORDER_FIELDS},
+                **{f"{field}_id": data[field] for field in GEO_FIELDS},
+            )
+            # Commande et lignes comptées ensemble par record_order_lines (une écriture par agrégat)
+            order._sales_recorded_with_lines = True
+            order.save(force_insert=True)
+            items = OrderItem.objects.bulk_create([
+                OrderItem(
+                    order=order,
+                    product=line["product"],
+                    quantity=line["qty"],
+                    price=line["product"].price,
+                )
+                for line in cart.lines
+            ])
+            # bulk_create n'envoie pas de signal : agrégats de ventes mis à jour explicitement
+            record_order_lines(order, [(item.product_id, item.quantity, item.subtotal) for item in items])
+            # Voisins « achetés ensemble » recalculés hors requête (build_recommendations --pending)
+            queue_neighbor_updates(item.product_id for item in items)
+    except IntegrityError:
+        # Deux soumissions simultanées avec la même clé : la première a gagné
+        existing = find_order(user, idempotency_key)
+        if existing is None:
+            raise
+        return existing, False
+    return order, True
+
+
+def refresh_order_totals(order_ids):
+    """Recalcule `total` et `items_count` des commandes données en un seul UPDATE."""
+    lines = OrderItem.objects.filter(order=OuterRef("pk")).values("order")
+    line_total = lines.annotate(
+        s=Sum(F("price") * F("quantity"), output_field=DecimalField(max_digits=12, decimal_places=2))
+    ).values("s")
+    line_count = lines.annotate(n=Sum("quantity")).values("n")
+    Order.objects.filter(pk__in=order_ids).update(
+        total=Coalesce(Subquery(line_total), Value(Decimal("0.00")), output_field=DecimalField(max_digits=10, decimal_places=2)),
+        items_count=Coalesce(Subquery(line_count), Value(0), output_field=PositiveIntegerField()),
+    )
+
+
+# 🔹 Total et nombre d'articles suivent les lignes de la commande
+@receiver(post_save, sender=OrderItem)
+@receiver(post_delete, sender=OrderItem)
+def order_item_changed(sender, instance, **kwargs):
+    refresh_order_totals([instance.order_id])
@@ -0,0 +1,122 @@
+# products_app/recommendations.py
+"""
+Recommandations « souvent achetés ensemble ».
+
+Deux produits sont voisins quand ils figurent dans une même commande ; le
+score d'une paire est le nombre de commandes qui les contiennent tous les
+deux. Seuls les `TOP_K` meilleurs voisins de chaque produit sont conservés
+dans `ProductNeighbor` (table creuse, index `(product, -score, neighbor)`).
+
+- `place_order` appelle `queue_neighbor_updates` dans sa transaction : les
+  produits de la commande sont inscrits dans `PendingNeighborUpdate` (un seul
+  INSERT groupé, rien d'autre pendant la requête HTTP) ;
+- `refresh_pending_neighbors` (`build_recommendations --pending`, à lancer
+  périodiquement) recalcule exactement les voisins de ces seuls produits
+  depuis `OrderItem`, puis vide la file : pas d'écart avec une reconstruction ;
+- `rebuild_recommendations` recalcule toute la table par une auto-jointure
+  groupée sur `OrderItem` (`build_recommendations`).
+
+La commande incrémente la version du catalogue après chaque mise à jour : les
+fiches produit en cache pour les visiteurs anonymes affichent les nouveaux
+voisins. La fiche lit les recommandations avec une requête indexée sur
+`ProductNeighbor` puis un `in_bulk` sur `Product` : aucun calcul de
+co-occurrence pendant la requête HTTP.
+"""
+
+from django.db import transaction
+from django.db.models import Count, F
+
+from .models import OrderItem, PendingNeighborUpdate, Product, ProductNeighbor
+
+TOP_K = 20
+DISPLAY_COUNT = 4
+
+
+def recommended_products(product_id, limit=DISPLAY_COUNT):
+    """Produits actifs souvent achetés avec `product_id`, du plus fréquent au moins fréquent."""
+    ids = list(
+        ProductNeighbor.objects.filter(product_id=product_id)
+        .order_by("-score", "neighbor_id").values_list("neighbor_id", flat=True)[:TOP_K]
+    )
+    if not ids:
+        return []
+    products = Product.objects.filter(is_active=True).select_related("main_image").in_bulk(ids)
+    return [products[pk] for pk in ids if pk in products][:limit]
+
+
+# -------------------------
+# Calcul des voisins
+# -------------------------
+def _neighbor_rows(items, top_k):
+    """`ProductNeighbor` des produits de `items` (lignes de commande), `top_k` par produit, en flux."""
+    pairs = (
+        items.annotate(neighbor_id=F("order__items__product_id"))
+        .exclude(neighbor_id=F("product_id"))
+        .values("product_id", "neighbor_id")
+        .annotate(score=Count("order_id", distinct=True))
+        .order_by("product_id", "-score", "neighbor_id")
+    )
+    current, kept = None, 0
+    for row in pairs.iterator():
+        if row["product_id"] != current:
+            current, kept = row["product_id"], 0
+        if kept >= top_k:
+            continue
+        kept += 1
+        yield ProductNeighbor(product_id=current, neighbor_id=row["neighbor_id"], score=row["score"])
+
+
+def _insert(rows, batch_size):
+    created, batch = 0, []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            ProductNeighbor.objects.bulk_create(batch)
+            created += len(batch)
+            batch = []
+    ProductNeighbor.objects.bulk_create(batch)
+    return created + len(batch)
+
+
+# -------------------------
+# Mise à jour incrémentale
+# -------------------------
+def queue_neighbor_updates(product_ids):
+    """À appeler dans la transaction de la commande : ses produits seront recalculés plus tard."""
+    ids = set(product_ids)
+    if len(ids) >= 2:
+        PendingNeighborUpdate.objects.bulk_create([PendingNeighborUpdate(product_id=pk) for pk in ids])
+
+
+def refresh_pending_neighbors(top_k=TOP_K, batch_size=5000, chunk_size=500):
+    """Recalcule les voisins des produits en attente, par paquets de `chunk_size` entrées de la file.
+
+    Les entrées traitées sont supprimées par id : celles ajoutées pendant le calcul
+    restent pour le passage suivant. Retourne `(produits recalculés, paires gardées)`.
+    """
+    refreshed = created = 0
+    last_id = 0
+    while True:
+        pending = list(
+            PendingNeighborUpdate.objects.filter(id__gt=last_id).order_by("id")
+            .values_list("id", "product_id")[:chunk_size]
+        )
+        if not pending:
+            return refreshed, created
+        last_id = pending[-1][0]
+        product_ids = {product_id for _, product_id in pending}
+        with transaction.atomic():
+            ProductNeighbor.objects.filter(product_id__in=product_ids).delete()
+            created += _insert(_neighbor_rows(OrderItem.objects.filter(product_id__in=product_ids), top_k), batch_size)
+            PendingNeighborUpdate.objects.filter(id__in=[pk for pk, _ in pending]).delete()
+        refreshed += len(product_ids)
+
+
+# -------------------------
+# Reconstruction complète
+# -------------------------
+def rebuild_recommendations(top_k=TOP_K, batch_size=5000):
+    """Recalcule `ProductNeighbor` depuis toutes les commandes. Retourne le nombre de paires gardées."""
+    with transaction.atomic():
+        ProductNeighbor.objects.all().delete()
+        return _insert(_neighbor_rows(OrderItem.objects.all(), top_k), batch_size)
@@ -0,0 +1,276 @@
+# products_app/sales.py
+"""
+Agrégats de ventes et tableau de bord staff (`sales_dashboard`).
+
+Deux tables d'agrégats, une ligne par jour (fuseau local) et par statut :
+`DailyWilayaSales` (commandes, articles, chiffre d'affaires par wilaya) et
+`DailyProductSales` (quantités et chiffre d'affaires par produit). Elles sont
+mises à jour par incréments groupés (`counters.increment`, un `UPDATE ... SET
+x = x + n` par table) :
+- à l'enregistrement d'une commande : `place_order` appelle `record_order_lines`
+  (ses lignes sont insérées en `bulk_create`, sans signal), qui compte la
+  commande et ses lignes en une seule écriture par table ;
+- quand une commande change de statut ou de wilaya (signaux `pre_save` /
+  `post_save` de `Order`) : sa contribution passe d'une ligne à l'autre ;
+- quand une ligne de commande est modifiée ou supprimée (admin).
+
+Les écritures qui contournent les signaux (`update()`, `bulk_create`, SQL
+direct) sont rattrapées par `backfill_sales_rollups`, qui reconstruit les
+agrégats depuis les commandes. Le tableau de bord ne lit que ces tables : son
+coût dépend du nombre de jours affichés, pas du nombre de commandes.
+"""
+
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, DecimalField, F, Sum
+from django.db.models.functions import TruncDate
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .counters import increment
+from .exports import start_of_day
+from .models import DailyProductSales, DailyWilayaSales, Order, OrderItem
+
+# Statuts comptés dans le chiffre d'affaires
+REVENUE_STATUSES = ("pending", "completed")
+DASHBOARD_PERIODS = (7, 30, 90, 365)
+DEFAULT_PERIOD = 30
+TOP_SIZE = 10
+# Champs de `Order` qui déterminent sa ligne d'agrégat
+_ORDER_KEY_FIELDS = {"status", "wilaya", "wilaya_id"}
+
+_LINE_REVENUE = Sum(F("price") * F("quantity"), output_field=DecimalField(max_digits=14, decimal_places=2))
+
+
+# -------------------------
+# Mises à jour incrémentales
+# -------------------------
+def _apply(order, lines, sign, orders=0):
+    """Ajoute (sign=1) ou retire (sign=-1) des lignes `(product_id, quantité, montant)`.
+
+    Lignes regroupées par produit : une écriture groupée par table, quel que soit
+    le nombre de lignes de la commande.
+    """
+    day = timezone.localdate(order.created_at)
+    items, revenue = 0, Decimal("0.00")
+    per_product = defaultdict(lambda: {"quantity": 0, "revenue": Decimal("0.00")})
+    for product_id, quantity, amount in lines:
+        items += quantity
+        revenue += amount
+        totals = per_product[day, product_id, order.status]
+        totals["quantity"] += sign * quantity
+        totals["revenue"] += sign * amount
+    increment(DailyProductSales, ("day", "product_id", "status"), per_product)
+    increment(DailyWilayaSales, ("day", "wilaya_id", "status"), {
+        (day, order.wilaya_id, order.status): {
+            "orders_count": sign * orders, "items_count": sign * items, "revenue": sign * revenue,
+        },
+    })
+
+
+def _order_lines(order_id):
+    return list(
+        OrderItem.objects.filter(order_id=order_id).values("product_id")
+        .annotate(qty=Sum("quantity"), amount=_LINE_REVENUE)
+        .order_by("product_id").values_list("product_id", "qty", "amount")
+    )
+
+
+def record_order_lines(order, lines):
+    """Nouvelle commande et ses lignes insérées sans signal : `lines` = `(product_id, quantité, montant)`.
+
+    La commande doit avoir été créée avec `_sales_recorded_with_lines = True`,
+    sans quoi `order_saved` l'aurait déjà comptée.
+    """
+    _apply(order, lines, 1, orders=1)
+
+
+@receiver(pre_save, sender=Order)
+def remember_order_key(sender, instance, raw=False, **kwargs):
+    # Statut et wilaya avant la sauvegarde, pour déplacer la contribution si l'un change
+    instance._sales_before = None
+    update_fields = kwargs.get("update_fields")
+    if update_fields is not None and not _ORDER_KEY_FIELDS.intersection(update_fields):
+        return
+    if instance.pk and not raw:
+        instance._sales_before = Order.objects.filter(pk=instance.pk).only(
+            "created_at", "wilaya_id", "status"
+        ).first()
+
+
+@receiver(post_save, sender=Order)
+def order_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    before = getattr(instance, "_sales_before", None)
+    if created:
+        # Nouvelle commande : pas encore de lignes (place_order la compte avec les siennes)
+        if not getattr(instance, "_sales_recorded_with_lines", False):
+            _apply(instance, [], 1, orders=1)
+    elif before is not None and (before.status, before.wilaya_id) != (instance.status, instance.wilaya_id):
+        lines = _order_lines(instance.pk)
+        _apply(before, lines, -1, orders=1)
+        _apply(instance, lines, 1, orders=1)
+
+
+@receiver(post_delete, sender=Order)
+def order_deleted(sender, instance, **kwargs):
+    # Les lignes ont déjà été retirées par la suppression en cascade des OrderItem
+    _apply(instance, [], -1, orders=1)
+
+
+@receiver(pre_save, sender=OrderItem)
+def remember_item_line(sender, instance, raw=False, **kwargs):
+    instance._sales_before = None
+    if instance.pk and not raw:
+        instance._sales_before = OrderItem.objects.filter(pk=instance.pk).values_list(
+            "product_id", "quantity", "price"
+        ).first()
+
+
+@receiver(post_save, sender=OrderItem)
+def order_item_saved(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    before = getattr(instance, "_sales_before", None)
+    if before is not None:
+        product_id, quantity, price = before
+        _apply(instance.order, [(product_id, quantity, price * quantity)], -1)
+    _apply(instance.order, [(instance.product_id, instance.quantity, instance.price * instance.quantity)], 1)
+
+
+@receiver(post_delete, sender=OrderItem)
+def order_item_deleted(sender, instance, **kwargs):
+    order = Order.objects.filter(pk=instance.order_id).only("created_at", "wilaya_id", "status").first()
+    if order is not None:
+        _apply(order, [(instance.product_id, instance.quantity, instance.price * instance.quantity)], -1)
+
+
+# -------------------------
+# Reconstruction complète
+# -------------------------
+def rebuild_sales_rollups(since=None, batch_size=2000):
+    """Recalcule les agrégats à partir des commandes (toutes, ou à partir du jour `since`).
+
+    Trois agrégations groupées (commandes, lignes par wilaya, lignes par produit),
+    puis remplacement des lignes concernées dans une transaction.
+    Retourne `(lignes wilaya, lignes produit)`.
+    """
+    orders = Order.objects.all()
+    items = OrderItem.objects.all()
+    if since is not None:
+        orders = orders.filter(created_at__gte=start_of_day(since))
+        items = items.filter(order__created_at__gte=start_of_day(since))
+
+    wilaya_rows = defaultdict(lambda: {"orders_count": 0, "items_count": 0, "revenue": Decimal("0.00")})
+    for row in (orders.annotate(day=TruncDate("created_at")).values("day", "wilaya_id", "status")
+                .annotate(n=Count("id")).order_by().iterator()):
+        wilaya_rows[row["day"], row["wilaya_id"], row["status"]]["orders_count"] = row["n"]
+    for row in (items.annotate(day=TruncDate("order__created_at"), wilaya_id=F("order__wilaya_id"),
+                               status=F("order__status"))
+                .values("day", "wilaya_id", "status")
+                .annotate(qty=Sum("quantity"), amount=_LINE_REVENUE).order_by().iterator()):
+        totals = wilaya_rows[row["day"], row["wilaya_id"], row["status"]]
+        totals["items_count"], totals["revenue"] = row["qty"], row["amount"]
+
+    product_rows = (
+        DailyProductSales(day=row["day"], product_id=row["product_id"], status=row["status"],
+                          quantity=row["qty"], revenue=row["amount"])
+        for row in (items.annotate(day=TruncDate("order__created_at"), status=F("order__status"))
+                    .values("day", "product_id", "status")
+                    .annotate(qty=Sum("quantity"), amount=_LINE_REVENUE).order_by().iterator())
+    )
+
+    with transaction.atomic():
+        for model in (DailyWilayaSales, DailyProductSales):
+            stale = model.objects.all() if since is None else model.objects.filter(day__gte=since)
+            stale.delete()
+        DailyWilayaSales.objects.bulk_create(
+            [DailyWilayaSales(day=day, wilaya_id=wilaya_id, status=status, **totals)
+             for (day, wilaya_id, status), totals in wilaya_rows.items()],
+            batch_size=batch_size,
+        )
+        product_count = 0
+        batch = []
+        for row in product_rows:
+            batch.append(row)
+            if len(batch) >= batch_size:
+                DailyProductSales.objects.bulk_create(batch)
+                product_count += len(batch)
+                batch = []
+        DailyProductSales.objects.bulk_create(batch)
+        product_count += len(batch)
+    return len(wilaya_rows), product_count
+
+
+# -------------------------
+# Tableau de bord
+# -------------------------
+def dashboard_period(params):
+    """Nombre de jours affichés (`?days=`), borné aux valeurs proposées."""
+    try:
+        days = int(params.get("days"))
+    except (TypeError, ValueError):
+        return DEFAULT_PERIOD
+    return days if days in DASHBOARD_PERIODS else DEFAULT_PERIOD
+
+
+def dashboard(days):
+    """Chiffres du tableau de bord pour les `days` derniers jours (aujourd'hui inclus)."""
+    today = timezone.localdate()
+    start = today - timedelta(days=days - 1)
+    wilaya_sales = DailyWilayaSales.objects.filter(day__gte=start)
+    product_sales = DailyProductSales.objects.filter(day__gte=start, status__in=REVENUE_STATUSES)
+
+    by_status = {
+        row["status"]: row
+        for row in wilaya_sales.values("status").annotate(
+            orders=Sum("orders_count"), items=Sum("items_count"), amount=Sum("revenue")
+        ).order_by()
+    }
+    status_rows = [
+        (code, label, by_status.get(code, {}).get("orders") or 0, by_status.get(code, {}).get("amount") or 0)
+        for code, label in Order.STATUS_CHOICES
+    ]
+
+    per_day = {
+        row["day"]: row
+        for row in wilaya_sales.filter(status__in=REVENUE_STATUSES).values("day").annotate(
+            orders=Sum("orders_count"), amount=Sum("revenue")
+        ).order_by()
+    }
+    daily = [
+        {"day": day, "orders": per_day.get(day, {}).get("orders") or 0,
+         "revenue": per_day.get(day, {}).get("amount") or Decimal("0.00")}
+        for day in (start + timedelta(days=offset) for offset in range(days))
+    ]
+    peak = max((row["revenue"] for row in daily), default=0) or 1
+    for row in daily:
+        row["percent"] = round(row["revenue"] * 100 / peak)
+
+    revenue_rows = wilaya_sales.filter(status__in=REVENUE_STATUSES)
+    totals = revenue_rows.aggregate(orders=Sum("orders_count"), items=Sum("items_count"), amount=Sum("revenue"))
+    top_wilayas = list(
+        revenue_rows.values("wilaya_id", "wilaya__name").annotate(orders=Sum("orders_count"), amount=Sum("revenue"))
+        .order_by("-amount", "wilaya__name")[:TOP_SIZE]
+    )
+    top_products = list(
+        product_sales.values("product_id", "product__name").annotate(qty=Sum("quantity"), amount=Sum("revenue"))
+        .order_by("-amount", "product_id")[:TOP_SIZE]
+    )
+    return {
+        "days": days,
+        "start": start,
+        "end": today,
+        "orders": totals["orders"] or 0,
+        "items": totals["items"] or 0,
+        "revenue": totals["amount"] or Decimal("0.00"),
+        "by_status": status_rows,
+        "daily": daily,
+        "top_wilayas": top_wilayas,
+        "top_products": top_products,
+    }
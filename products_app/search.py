@@ -0,0 +1,213 @@
+# products_app/search.py
+"""
+Index de recherche en mémoire pour la recherche instantanée des produits.
+
+Chaque worker garde un index inversé (préfixes + trigrammes) sur `Product.name`,
+normalisé sans accents ni casse. L'index est construit au premier appel puis
+tenu à jour par les signaux `post_save` / `post_delete` de `Product`.
+
+L'index retient la version du catalogue (`products_app.cache`, partagée par
+tous les workers) lue au moment de sa construction : toute modification faite
+dans un autre worker, ou via `queryset.update()` suivi de
+`bump_catalog_version()` (actions de l'admin), change cette version et
+l'index est reconstruit avant la recherche suivante. Un produit désactivé
+n'est donc jamais renvoyé. La reconstruction périodique reste un filet de
+sécurité pour les écritures qui ne changent pas la version.
+"""
+
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict, defaultdict
+
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .cache import get_catalog_version
+from .models import Product
+
+MAX_PREFIX_LENGTH = 15
+QUERY_CACHE_SIZE = 256
+REBUILD_INTERVAL = 300  # secondes
+MIN_TRIGRAM_SIMILARITY = 0.5
+
+_NON_ALNUM = re.compile(r"[^0-9a-z]+")
+
+
+def normalize(text):
+    """'Mbappé  Maillot' -> 'mbappe maillot'"""
+    text = unicodedata.normalize("NFKD", text or "")
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    return _NON_ALNUM.sub(" ", text.casefold()).strip()
+
+
+def trigrams(word):
+    padded = f"  {word} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class ProductSearchIndex:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._docs = {}
+        self._prefixes = defaultdict(set)
+        self._trigrams = defaultdict(set)
+        self._cache = OrderedDict()
+        self._built_at = None
+        self._version = None
+
+    # -------------------------
+    # Construction / mise à jour
+    # -------------------------
+    def build(self):
+        # Construit un nouvel index hors verrou puis l'échange : les recherches
+        # en cours ne sont jamais bloquées par la lecture de la base.
+        fresh = ProductSearchIndex()
+        version = get_catalog_version()  # lue avant la base : une écriture concurrente forcera un nouveau build
+        # Base principale : une réplique en retard figerait l'ancien catalogue sous la nouvelle version
+        products = Product.objects.using(DEFAULT_DB_ALIAS).filter(is_active=True).only("id", "name", "price", "image")
+        for product in products.iterator():
+            fresh._add(product)
+        with self._lock:
+            self._docs, self._prefixes, self._trigrams = fresh._docs, fresh._prefixes, fresh._trigrams
+            self._cache.clear()
+            self._built_at = time.monotonic()
+            self._version = version
+
+    def is_built(self):
+        """Vrai si l'index de ce worker est construit et récent (état en mémoire, sans entrée/sortie)."""
+        return self._built_at is not None and time.monotonic() - self._built_at <= REBUILD_INTERVAL
+
+    def is_ready(self, version=None):
+        """Vrai si une recherche peut être servie sans accès à la base (ni changement de catalogue).
+
+        `version` : version du catalogue déjà lue par l'appelant, sinon lue dans le cache.
+        """
+        return self.is_built() and self._version == (get_catalog_version() if version is None else version)
+
+    def mark_stale(self):
+        """Force une reconstruction à la prochaine recherche (ex. après `queryset.update()`)."""
+        with self._lock:
+            self._built_at = None
+            self._cache.clear()
+
+    def _ensure_built(self):
+        if not self.is_ready():
+            self.build()
+
+    def _add(self, product):
+        words = normalize(product.name).split()
+        self._docs[product.id] = {
+            "id": product.id,
+            "name": product.name,
+            "price": product.price,
+            "image_url": product.image.url if product.image else "",
+            "words": words,
+        }
+        for word in words:
+            for i in range(1, min(len(word), MAX_PREFIX_LENGTH) + 1):
+                self._prefixes[word[:i]].add(product.id)
+            for gram in trigrams(word):
+                self._trigrams[gram].add(product.id)
+
+    def _remove(self, product_id):
+        doc = self._docs.pop(product_id, None)
+        if doc is None:
+            return
+        for word in doc["words"]:
+            for i in range(1, min(len(word), MAX_PREFIX_LENGTH) + 1):
+                self._prefixes[word[:i]].discard(product_id)
+            for gram in trigrams(word):
+                self._trigrams[gram].discard(product_id)
+
+    def update(self, product):
+        with self._lock:
+            if self._built_at is None:
+                return  # sera pris en compte à la construction
+            self._remove(product.id)
+            if product.is_active:
+                self._add(product)
+            self._cache.clear()
+
+    def remove(self, product_id):
+        with self._lock:
+            self._remove(product_id)
+            self._cache.clear()
+
+    # -------------------------
+    # Recherche
+    # -------------------------
+    def _score_token(self, token):
+        """Retourne {product_id: score} pour un mot de la requête."""
+        scores = {}
+        for product_id in self._prefixes.get(token[:MAX_PREFIX_LENGTH], ()):
+            if any(word.startswith(token) for word in self._docs[product_id]["words"]):
+                scores[product_id] = 2.0
+        if len(token) < 3:
+            return scores
+        grams = trigrams(token)
+        counts = defaultdict(int)
+        for gram in grams:
+            for product_id in self._trigrams.get(gram, ()):
+                counts[product_id] += 1
+        for product_id, count in counts.items():
+            similarity = count / len(grams)
+            if similarity >= MIN_TRIGRAM_SIMILARITY and similarity > scores.get(product_id, 0):
+                scores[product_id] = similarity
+        return scores
+
+    def search(self, query, limit=10):
+        norm = normalize(query)
+        if not norm:
+            return []
+        self._ensure_built()
+        return self._search(norm, limit)
+
+    def search_if_ready(self, query, version, limit=10):
+        """Recherche en mémoire si l'index correspond à `version`, sinon None (aucune entrée/sortie)."""
+        if not self.is_ready(version):
+            return None
+        norm = normalize(query)
+        return self._search(norm, limit) if norm else []
+
+    def _search(self, norm, limit):
+        with self._lock:
+            key = (norm, limit)
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return [self._docs[pid] for pid in self._cache[key] if pid in self._docs]
+
+            totals = None
+            for token in norm.split():
+                scores = self._score_token(token)
+                if totals is None:
+                    totals = scores
+                else:
+                    totals = {pid: totals[pid] + score for pid, score in scores.items() if pid in totals}
+                if not totals:
+                    break
+            ranked = sorted(
+                totals or {},
+                key=lambda pid: (-totals[pid], len(self._docs[pid]["name"]), pid),
+            )[:limit]
+
+            self._cache[key] = ranked
+            if len(self._cache) > QUERY_CACHE_SIZE:
+                self._cache.popitem(last=False)
+            return [self._docs[pid] for pid in ranked]
+
+
+product_index = ProductSearchIndex()
+
+
+# 🔹 Synchronisation de l'index avec les produits
+@receiver(post_save, sender=Product)
+def index_product(sender, instance, **kwargs):
+    product_index.update(instance)
+
+
+@receiver(post_delete, sender=Product)
+def unindex_product(sender, instance, **kwargs):
+    product_index.remove(instance.id)
@@ -0,0 +1,37 @@
+from django import template
+from django.core.cache import cache
+from django.db.models import prefetch_related_objects
+from django.template.loader import get_template
+from django.utils.safestring import mark_safe
+
+register = template.Library()
+
+CARD_TEMPLATE = "products_app/_product_card.html"
+CARD_CACHE_SECONDS = 60 * 60
+
+
+def card_key(product):
+    return f"card:{product.id}:{product.updated_at.timestamp() if product.updated_at else 0}"
+
+
+@register.simple_tag
+def product_cards(products):
+    """Cartes produits rendues depuis le cache, par fragment.
+
+    Chaque carte est mise en cache sous `(product.id, updated_at)` : une seule
+    lecture groupée (`get_many`) pour toute la page, et seules les cartes
+    manquantes sont rendues (leurs images préchargées en une requête).
+    """
+    products = list(products)
+    keys = {product.id: card_key(product) for product in products}
+    cached = cache.get_many(keys.values())
+
+    missing = [product for product in products if keys[product.id] not in cached]
+    if missing:
+        prefetch_related_objects(missing, "images")
+        card = get_template(CARD_TEMPLATE)
+        rendered = {keys[product.id]: card.render({"product": product}) for product in missing}
+        cache.set_many(rendered, CARD_CACHE_SECONDS)
+        cached.update(rendered)
+
+    return mark_safe("".join(cached[keys[product.id]] for product in products))
@@ -0,0 +1,32 @@
+from django import template
+from django.utils.html import format_html
+
+from products_app.images import DERIVATIVE_SIZES, derivative_exists, derivative_name
+
+register = template.Library()
+
+
+@register.simple_tag
+def img_attrs(image, size="card", sizes="100vw", lazy=True):
+    """Attributs src/srcset/sizes d'une image produit.
+
+    Usage : <img {% img_attrs img.image "card" sizes="(max-width: 768px) 50vw, 25vw" %} alt="...">
+    Sans déclinaison disponible, renvoie simplement l'image d'origine.
+    """
+    if not image:
+        return ""
+    storage = image.storage
+    available = [name for name in DERIVATIVE_SIZES if derivative_exists(image, name)]
+    loading = format_html(' loading="lazy" decoding="async"') if lazy else ""
+    if not available:
+        return format_html('src="{}"{}', image.url, loading)
+
+    src_size = size if size in available else available[-1]
+    srcset = ", ".join(
+        f"{storage.url(derivative_name(image.name, name))} {DERIVATIVE_SIZES[name]}w"
+        for name in available
+    )
+    return format_html(
+        'src="{}" srcset="{}" sizes="{}"{}',
+        storage.url(derivative_name(image.name, src_size)), srcset, sizes, loading,
+    )
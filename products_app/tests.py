@@ -1,3 +1,920 @@
-from django.test import TestCase
+import json
+import os
+import tempfile
+import threading
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, IntegrityError, connection, connections, transaction
+from django.http import HttpResponse
+from django.test import Client, RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from myshop.routers import REPLICA_DB_ALIAS, PrimaryReplicaRouter, _pinned, check_persistent_connections
+from .board import board_page
+from .cache import bump_catalog_version
+from .cart import (
+    CacheCartStore, DatabaseCartStore, SessionCartStore, SignedCookieCartStore, check_cart_store_backend,
+)
+from .exports import filter_orders, order_rows
+from .geo import GeoTree, get_tree
+from .metrics import MetricsMiddleware, recorder
+from .models import (
+    Cart, CartItem, Commune, DailyProductSales, DailyWilayaSales, Daira, Order, OrderItem, Product, ProductImage,
+    ProductNeighbor, Wilaya,
+)
+from .recommendations import queue_neighbor_updates, rebuild_recommendations, refresh_pending_neighbors
+from .sales import rebuild_sales_rollups
+from .search import ProductSearchIndex, product_index
+from .views import ajax_geo_tree, search_products
+
+User = get_user_model()
+
+# Les tests n'écrivent ni dans le cache partagé ni dans la base de métriques du projet (fichiers sous BASE_DIR)
+TEST_SETTINGS = {
+    "CACHES": {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "products_app-tests"}},
+    "METRICS_DB_PATH": os.path.join(tempfile.gettempdir(), "myshop-tests-metrics.sqlite3"),
+}
+
+
+@override_settings(**TEST_SETTINGS)
+class ShopTestCase(TestCase):
+    """Catalogue, géographie et client connecté communs aux tests de commande."""
+
+    def setUp(self):
+        cache.clear()
+        self.wilaya = Wilaya.objects.create(name="Alger")
+        self.daira = Daira.objects.create(name="Bab El Oued", wilaya=self.wilaya)
+        self.commune = Commune.objects.create(name="Bologhine", daira=self.daira)
+        self.products = [Product.objects.create(name=f"Produit {i}", price=Decimal("100.00") + i) for i in range(20)]
+        self.user = User.objects.create_user(username="client", password="motdepasse")
+        self.client.force_login(self.user)
+
+    def fill_cart(self, products, quantity=1):
+        cart, _ = Cart.objects.get_or_create(user=self.user)
+        CartItem.objects.bulk_create([CartItem(cart=cart, product=product, quantity=quantity) for product in products])
+
+    def checkout(self, idempotency_key):
+        return self.client.post(reverse("products_app:checkout"), {
+            "full_name": "Client Test", "email": "client@example.com", "phone": "0550000000",
+            "address_details": "12 rue des Oliviers", "wilaya": self.wilaya.id, "daira": self.daira.id,
+            "commune": self.commune.id, "idempotency_key": idempotency_key,
+        })
+
+
+# 🔹 Catalogue paginé par curseur
+class CatalogPaginationTests(ShopTestCase):
+    @mock.patch("products_app.views.CATALOG_PAGE_SIZE", 5)
+    def test_catalog_pages_cover_active_products_once(self):
+        Product.objects.filter(pk=self.products[3].pk).update(is_active=False)
+        seen, pages = [], 0
+        url = reverse("products_app:home_products")
+        while url:
+            data = self.client.get(url).json()
+            pages += 1
+            seen += [
+                product.id for product in self.products
+                if f'href="{reverse("products_app:product_detail", args=[product.id])}"' in data["html"]
+            ]
+            url = data["next_url"]
+
+        self.assertEqual(pages, 4)
+        self.assertEqual(sorted(seen), sorted(product.id for product in self.products if product != self.products[3]))
+
+
+# 🔹 Index de recherche en mémoire
+class SearchIndexTests(ShopTestCase):
+    def setUp(self):
+        super().setUp()
+        self.maillot = Product.objects.create(name="Maillot Mbappé", price=Decimal("4500.00"))
+        self.tapis = Product.objects.create(name="Tapis berbère", price=Decimal("12000.00"))
+
+    def names(self, index, query):
+        return [doc["name"] for doc in index.search(query)]
+
+    def test_prefix_accent_and_typo_matches(self):
+        index = ProductSearchIndex()
+        index.build()
+        self.assertEqual(self.names(index, "mbap"), ["Maillot Mbappé"])
+        self.assertEqual(self.names(index, "BERBERE"), ["Tapis berbère"])
+        self.assertEqual(self.names(index, "tapiz"), ["Tapis berbère"])
+        self.assertEqual(self.names(index, "maillot tapis"), [])
+        self.assertEqual(self.names(index, "  !! "), [])
+
+    def test_signals_keep_the_index_current(self):
+        product_index.build()
+        self.tapis.name = "Tapis kabyle"
+        self.tapis.save()
+        self.assertEqual(self.names(product_index, "kabyle"), ["Tapis kabyle"])
+
+        self.tapis.is_active = False
+        self.tapis.save()
+        self.assertEqual(self.names(product_index, "kabyle"), [])
+
+        self.maillot.delete()
+        self.assertEqual(self.names(product_index, "mbappe"), [])
+
+    def test_catalog_version_bump_rebuilds_the_index(self):
+        product_index.build()
+        # update() sans signal : l'index ne le voit qu'au changement de version
+        Product.objects.filter(pk=self.maillot.pk).update(is_active=False)
+        bump_catalog_version()
+
+        response = self.client.get(reverse("products_app:search"), {"q": "mbappe"})
+
+        self.assertEqual(response.json(), {"results": []})
+
+    def test_search_view_returns_json(self):
+        response = self.client.get(reverse("products_app:search"), {"q": "maillot"})
+        self.assertEqual(
+            [(doc["id"], doc["name"]) for doc in response.json()["results"]],
+            [(self.maillot.id, "Maillot Mbappé")],
+        )
+        self.assertEqual(self.client.get(reverse("products_app:search")).json(), {"results": []})
+
+
+# 🔹 Validation de commande
+class CheckoutTests(ShopTestCase):
+    def test_replayed_submission_returns_the_same_order(self):
+        self.fill_cart(self.products[:2], quantity=2)
+
+        first = self.checkout("cle-1")
+        # Double clic : le panier a déjà été vidé, la commande existante est renvoyée
+        replay = self.checkout("cle-1")
+
+        order = Order.objects.get()
+        self.assertRedirects(first, reverse("products_app:order_success", args=[order.id]), fetch_redirect_response=False)
+        self.assertRedirects(replay, reverse("products_app:order_success", args=[order.id]), fetch_redirect_response=False)
+        self.assertEqual(order.items_count, 4)
+        self.assertEqual(order.total, Decimal("402.00"))
+        self.assertEqual(OrderItem.objects.count(), 2)
+
+    def test_same_key_for_another_user_creates_its_own_order(self):
+        self.fill_cart(self.products[:1])
+        self.checkout("cle-1")
+        other = User.objects.create_user(username="autre", password="motdepasse")
+        self.user = other
+        self.client.force_login(other)
+        self.fill_cart(self.products[1:2])
+
+        self.checkout("cle-1")
+
+        self.assertEqual(Order.objects.filter(idempotency_key="cle-1").count(), 2)
+
+    def test_checkout_queries_do_not_grow_with_cart_lines(self):
+        # Arbre géographique, session et lignes d'agrégats du jour créés par une première commande
+        self.fill_cart(self.products[-1:])
+        self.checkout("premiere")
+        # Deux lignes puis dix-sept, toutes sur des produits encore absents des agrégats
+        self.fill_cart(self.products[:2])
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.checkout("petit").status_code, 302)
+
+        self.fill_cart(self.products[2:19])
+        with self.assertNumQueries(len(queries)):
+            self.checkout("grand")
+
+
+# 🔹 Arbre géographique en mémoire
+class GeoTreeTests(ShopTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.logout()
+        self.other_daira = Daira.objects.create(name="Hussein Dey", wilaya=self.wilaya)
+
+    def test_tree_is_served_with_an_etag_and_revalidated(self):
+        response = self.client.get(reverse("products_app:ajax_geo_tree"))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("public", response["Cache-Control"])
+        etag = response["ETag"]
+
+        # Arbre déjà chargé dans ce worker : ni requête SQL ni corps de réponse
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse("products_app:ajax_geo_tree"), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], etag)
+
+    def test_edit_changes_the_etag(self):
+        etag = self.client.get(reverse("products_app:ajax_geo_tree"))["ETag"]
+        Commune.objects.create(name="Kouba", daira=self.other_daira)
+
+        response = self.client.get(reverse("products_app:ajax_geo_tree"), HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+        self.assertContains(response, "Kouba")
+
+    def test_children_endpoints(self):
+        Commune.objects.create(name="Kouba", daira=self.other_daira)
+        dairas = self.client.get(reverse("products_app:ajax_load_dairas"), {"wilaya_id": self.wilaya.id}).json()
+        communes = self.client.get(reverse("products_app:ajax_load_communes"), {"daira_id": self.other_daira.id}).json()
+
+        self.assertEqual(sorted(d["name"] for d in dairas), ["Bab El Oued", "Hussein Dey"])
+        self.assertEqual([c["name"] for c in communes], ["Kouba"])
+        self.assertEqual(self.client.get(reverse("products_app:ajax_load_dairas"), {"wilaya_id": "x"}).json(), [])
+
+
+# 🔹 Chargement des wilayas, dairas et communes
+class LoadAlgeriaTests(ShopTestCase):
+    def setUp(self):
+        super().setUp()
+        rows = [
+            {"wilaya_name": "ALGER", "daira_name": "Bab El Oued", "commune_name": "Bologhine"},
+            {"wilaya_name": "Alger", "daira_name": "Bab  El Oued", "commune_name": "Raïs Hamidou"},
+            {"wilaya_name": "Oran", "daira_name": "Oran", "commune_name": "Oran"},
+            {"wilaya_name": "Oran", "daira_name": "Aïn El Turk", "commune_name": "Mers El Kébir"},
+        ]
+        handle, self.path = tempfile.mkstemp(suffix=".json")
+        with os.fdopen(handle, "w", encoding="utf-8") as f:
+            json.dump(rows, f)
+        self.addCleanup(os.remove, self.path)
+
+    def load(self, *args):
+        out = StringIO()
+        call_command("load_algeria", "--file", self.path, *args, stdout=out)
+        return out.getvalue()
+
+    def counts(self):
+        return Wilaya.objects.count(), Daira.objects.count(), Commune.objects.count()
+
+    def test_loading_twice_changes_nothing(self):
+        self.load()
+        self.assertEqual(self.counts(), (2, 3, 4))
+        # Clé naturelle : "ALGER" renomme la wilaya existante au lieu d'en créer une seconde
+        self.assertEqual(Wilaya.objects.get(pk=self.wilaya.pk).name, "ALGER")
+        snapshot = sorted(Commune.objects.values_list("id", "name", "daira_id"))
+
+        output = self.load()
+
+        self.assertEqual(self.counts(), (2, 3, 4))
+        self.assertEqual(sorted(Commune.objects.values_list("id", "name", "daira_id")), snapshot)
+        self.assertEqual(output.count("créées:     0  mises à jour:     0"), 3)
+
+    def test_dry_run_writes_nothing(self):
+        self.load("--dry-run")
+        self.assertEqual(self.counts(), (1, 1, 1))
+
+    def test_prune_keeps_places_used_by_orders(self):
+        kept = Commune.objects.create(name="Kouba", daira=self.daira)
+        Order.objects.create(user=self.user, wilaya=self.wilaya, daira=self.daira, commune=kept)
+        Commune.objects.create(name="Hydra", daira=self.daira)
+
+        self.load("--prune")
+
+        self.assertTrue(Commune.objects.filter(pk=kept.pk).exists())
+        self.assertFalse(Commune.objects.filter(name="Hydra").exists())
+
+
+# 🔹 Image principale dénormalisée
+class MainImageTests(ShopTestCase):
+    def setUp(self):
+        super().setUp()
+        # Pas de fichiers sur disque : les déclinaisons ne sont pas générées
+        patcher = mock.patch("products_app.images.generate_derivatives", return_value=0)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.product = self.products[0]
+
+    def add_image(self, name, is_main=False):
+        return ProductImage.objects.create(product=self.product, image=f"products/{name}.jpg", is_main=is_main)
+
+    def main_image_id(self):
+        return Product.objects.values_list("main_image_id", flat=True).get(pk=self.product.pk)
+
+    def test_new_main_image_replaces_the_previous_one(self):
+        first = self.add_image("face", is_main=True)
+        self.add_image("dos")
+        self.assertEqual(self.main_image_id(), first.id)
+
+        second = self.add_image("profil", is_main=True)
+
+        self.assertEqual(self.main_image_id(), second.id)
+        self.assertEqual(list(self.product.images.filter(is_main=True)), [second])
+
+    def test_unmarking_or_deleting_the_main_image_clears_it(self):
+        image = self.add_image("face", is_main=True)
+        image.is_main = False
+        image.save()
+        self.assertIsNone(self.main_image_id())
+
+        image.is_main = True
+        image.save()
+        image.delete()
+        self.assertIsNone(self.main_image_id())
+
+    def test_database_refuses_two_main_images(self):
+        self.add_image("face", is_main=True)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            ProductImage.objects.bulk_create([ProductImage(product=self.product, image="products/dos.jpg", is_main=True)])
+
+
+# 🔹 Cache des pages anonymes
+class PageCacheTests(ShopTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.logout()
+        self.product = self.products[0]
+        self.detail_url = reverse("products_app:product_detail", args=[self.product.id])
+        self.staff = Client()
+        self.staff.force_login(
+            User.objects.create_superuser(username="staff", email="staff@example.com", password="motdepasse")
+        )
+
+    def run_action(self, action):
+        response = self.staff.post(reverse("admin:products_app_product_changelist"), {
+            "action": action, "_selected_action": [self.product.id],
+        })
+        self.assertEqual(response.status_code, 302)
+
+    def test_page_is_served_from_cache_until_the_catalog_changes(self):
+        self.assertContains(self.client.get(self.detail_url), "Produit 0")
+        # update() sans signal : la page en cache est encore servie, sans requête
+        Product.objects.filter(pk=self.product.pk).update(name="Tapis berbère")
+        with self.assertNumQueries(0):
+            self.assertContains(self.client.get(self.detail_url), "Produit 0")
+
+        bump_catalog_version()
+
+        self.assertContains(self.client.get(self.detail_url), "Tapis berbère")
+
+    def test_product_save_invalidates_cached_pages(self):
+        self.assertContains(self.client.get(reverse("products_app:home")), "Produit 0")
+        self.product.name = "Tapis berbère"
+        self.product.save()
+
+        response = self.client.get(reverse("products_app:home"))
+
+        self.assertContains(response, "Tapis berbère")
+        self.assertNotContains(response, ">Produit 0<")
+
+    def test_admin_actions_invalidate_cached_pages(self):
+        home = reverse("products_app:home")
+        self.assertContains(self.client.get(home), self.detail_url)
+
+        self.run_action("make_inactive")
+        self.assertNotContains(self.client.get(home), self.detail_url)
+        self.assertEqual(self.client.get(self.detail_url).status_code, 200)
+
+        self.run_action("make_active")
+        self.assertContains(self.client.get(home), self.detail_url)
+
+    def test_authenticated_users_bypass_the_cache(self):
+        self.client.get(self.detail_url)
+        Product.objects.filter(pk=self.product.pk).update(name="Tapis berbère")
+        self.client.force_login(self.user)
+        self.assertContains(self.client.get(self.detail_url), "Tapis berbère")
+
+
+# 🔹 Totaux de commande maintenus
+class OrderTotalsTests(ShopTestCase):
+    def test_success_page_shows_the_stored_total(self):
+        Product.objects.filter(pk__in=[p.pk for p in self.products[:2]]).update(image="products/tapis.jpg")
+        self.fill_cart(self.products[:2], quantity=3)
+        self.checkout("cle-1")
+        order = Order.objects.get()
+
+        response = self.client.get(reverse("products_app:order_success", args=[order.id]))
+
+        self.assertEqual(order.total, Decimal("603.00"))
+        self.assertContains(response, "<th>603,00 DA</th>", html=True)
+
+    def test_line_changes_update_the_order(self):
+        order = Order.objects.create(user=self.user)
+        line = OrderItem.objects.create(order=order, product=self.products[0], quantity=2, price=Decimal("10.00"))
+        OrderItem.objects.create(order=order, product=self.products[1], quantity=1, price=Decimal("5.00"))
+        line.quantity = 4
+        line.save()
+        order.refresh_from_db()
+        self.assertEqual((order.total, order.items_count), (Decimal("45.00"), 5))
+
+        line.delete()
+        order.refresh_from_db()
+        self.assertEqual((order.total, order.items_count), (Decimal("5.00"), 1))
+
+    def test_reconcile_fixes_only_drifted_orders(self):
+        orders = [Order.objects.create(user=self.user) for _ in range(5)]
+        for order in orders:
+            OrderItem.objects.create(order=order, product=self.products[0], quantity=2, price=Decimal("10.00"))
+        # Écritures qui contournent les signaux
+        Order.objects.filter(pk__in=[orders[1].pk, orders[3].pk]).update(total=Decimal("0.00"), items_count=0)
+        empty = Order.objects.create(user=self.user)
+        Order.objects.filter(pk=empty.pk).update(total=Decimal("99.00"), items_count=9)
+
+        out = StringIO()
+        call_command("reconcile_order_totals", "--dry-run", "--batch-size", "2", stdout=out)
+        self.assertIn("6 commande(s) vérifiée(s), 3 écart(s), 0 corrigée(s)", out.getvalue())
+        self.assertEqual(Order.objects.filter(total=Decimal("0.00"), items_count=0).count(), 2)
+
+        out = StringIO()
+        call_command("reconcile_order_totals", "--batch-size", "2", stdout=out)
+        self.assertIn("3 écart(s), 3 corrigée(s)", out.getvalue())
+        self.assertEqual(
+            sorted(Order.objects.values_list("total", "items_count")),
+            [(Decimal("0.00"), 0)] + [(Decimal("20.00"), 2)] * 5,
+        )
+
+
+# 🔹 Liste des commandes dans l'admin
+class OrderAdminTests(ShopTestCase):
+    def setUp(self):
+        super().setUp()
+        ProductImage.objects.bulk_create([
+            ProductImage(product=product, image=f"products/{product.id}.jpg", is_main=True)
+            for product in self.products[:5]
+        ])
+        self.images = list(ProductImage.objects.order_by("product_id"))
+        for image in self.images:
+            Product.objects.filter(pk=image.product_id).update(main_image=image)
+        staff = User.objects.create_superuser(username="admin", password="motdepasse", email="admin@example.com")
+        self.client.force_login(staff)
+
+    def create_orders(self, count):
+        for i in range(count):
+            order = Order.objects.create(user=self.user, wilaya=self.wilaya, daira=self.daira, commune=self.commune)
+            OrderItem.objects.create(order=order, product=self.products[i % 5], quantity=2, price=Decimal("10.00"))
+            OrderItem.objects.create(order=order, product=self.products[5], quantity=1, price=Decimal("5.00"))
+
+    def test_changelist_queries_do_not_grow_with_orders(self):
+        url = reverse("admin:products_app_order_changelist")
+        self.create_orders(2)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get(url).status_code, 200)
+
+        self.create_orders(10)
+        with self.assertNumQueries(len(queries)):
+            response = self.client.get(url)
+
+        self.assertContains(response, '<td class="field-total_display">25.00 DA</td>', count=12)
+        self.assertContains(response, f'src="{self.images[0].image.url}"')
+
+
+# 🔹 Tableau des commandes (staff)
+@mock.patch("products_app.board.BOARD_PAGE_SIZE", 2)
+class OrderBoardTests(ShopTestCase):
+    def create_orders(self, count):
+        return [Order.objects.create(user=self.user, wilaya=self.wilaya) for _ in range(count)]
+
+    def test_cursor_breaks_ties_on_id(self):
+        orders = self.create_orders(5)
+        # Même horodatage pour toutes : seul l'id départage
+        Order.objects.update(created_at=timezone.now())
+        seen, params = [], {}
+        while True:
+            page, cursor = board_page(params)
+            seen += [order.id for order in page]
+            if cursor is None:
+                break
+            params = {"after": cursor}
+        self.assertEqual(seen, sorted((order.id for order in orders), reverse=True))
+
+    def test_last_full_page_has_no_cursor(self):
+        self.create_orders(4)
+        first, cursor = board_page({})
+        second, last_cursor = board_page({"after": cursor})
+        self.assertEqual((len(first), len(second), last_cursor), (2, 2, None))
+        # Curseur illisible : première page
+        self.assertEqual(board_page({"after": "illisible"})[0], first)
+
+
+# 🔹 Export CSV
+class OrderExportTests(ShopTestCase):
+    def create_orders(self, count):
+        for i in range(count):
+            order = Order.objects.create(user=self.user, wilaya=self.wilaya, full_name=f"Client {i}")
+            OrderItem.objects.bulk_create([
+                OrderItem(order=order, product=product, quantity=2, price=product.price)
+                for product in self.products[i % 5:i % 5 + 3]
+            ])
+
+    def test_export_queries_do_not_grow_with_orders(self):
+        self.create_orders(2)
+        with CaptureQueriesContext(connection) as queries:
+            rows = list(order_rows(Order.objects.all()))
+        self.assertEqual(len(rows), 3)
+
+        self.create_orders(10)
+        with self.assertNumQueries(len(queries)):
+            rows = list(order_rows(Order.objects.all()))
+        self.assertEqual(len(rows), 13)
+        self.assertIn("2x Produit 0 @ 100.00 DA", rows[1][12])
+
+    def test_chunks_cover_every_order_once(self):
+        self.create_orders(7)
+        rows = list(order_rows(Order.objects.all(), chunk_size=3))
+        self.assertEqual([row[0] for row in rows[1:]], list(Order.objects.order_by("id").values_list("id", flat=True)))
+
+    def test_impossible_date_is_ignored(self):
+        self.create_orders(2)
+        self.assertEqual(filter_orders(Order.objects.all(), {"date_from": "2025-02-30"}).count(), 2)
+
+        staff = User.objects.create_user(username="staff", password="motdepasse", is_staff=True)
+        self.client.force_login(staff)
+        response = self.client.get(reverse("products_app:export_orders_csv"), {"date_to": "2025-02-30"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(b"".join(response.streaming_content).decode("utf-8").splitlines()), 3)
+        self.assertEqual(self.client.get(reverse("products_app:admin_orders"), {"date_from": "2025-13-01"}).status_code, 200)
+
+
+# 🔹 Agrégats de ventes
+class SalesRollupTests(ShopTestCase):
+    def snapshot(self):
+        wilayas = list(
+            DailyWilayaSales.objects.exclude(orders_count=0, items_count=0, revenue=0)
+            .order_by("day", "wilaya_id", "status")
+            .values_list("day", "wilaya_id", "status", "orders_count", "items_count", "revenue")
+        )
+        products = list(
+            DailyProductSales.objects.exclude(quantity=0, revenue=0)
+            .order_by("day", "product_id", "status")
+            .values_list("day", "product_id", "status", "quantity", "revenue")
+        )
+        return wilayas, products
+
+    def test_sales_rollups_match_rebuild(self):
+        self.fill_cart(self.products[:3], quantity=2)
+        self.checkout("cle-1")
+        self.fill_cart(self.products[2:6])
+        self.checkout("cle-2")
+        first, second = Order.objects.order_by("id")
+        first.status = "completed"
+        first.save()
+        second.items.first().delete()
+        line = first.items.first()
+        line.quantity = 5
+        line.save()
+        manual = Order.objects.create(user=self.user)
+        OrderItem.objects.create(order=manual, product=self.products[7], quantity=1, price=Decimal("107.00"))
+
+        incremental = self.snapshot()
+        rebuild_sales_rollups()
+        self.assertEqual(incremental, self.snapshot())
+        self.assertEqual(len(incremental[0]), 3)
+
+    def test_checkout_writes_the_wilaya_rollup_once(self):
+        self.fill_cart(self.products[:3])
+        table = DailyWilayaSales._meta.db_table
+        with CaptureQueriesContext(connection) as queries:
+            self.checkout("cle-1")
+        writes = [
+            query["sql"] for query in queries.captured_queries
+            if table in query["sql"] and query["sql"].lstrip().upper().startswith(("INSERT", "UPDATE"))
+        ]
+        self.assertEqual(len(writes), 1)
+        self.assertEqual(
+            DailyWilayaSales.objects.values_list("orders_count", "items_count", "revenue").get(),
+            (1, 3, Decimal("303.00")),
+        )
+
+    def test_saving_other_fields_does_not_read_the_order(self):
+        order = Order.objects.create(user=self.user, wilaya=self.wilaya)
+        order.full_name = "Client Test"
+        with self.assertNumQueries(1):
+            order.save(update_fields=["full_name"])
+        order.status = "cancelled"
+        order.save(update_fields=["status"])
+        self.assertEqual(
+            list(DailyWilayaSales.objects.exclude(orders_count=0).values_list("status", "orders_count")),
+            [("cancelled", 1)],
+        )
+
+
+# 🔹 Recommandations « souvent achetés ensemble »
+class RecommendationTests(ShopTestCase):
+    def neighbors(self):
+        return list(ProductNeighbor.objects.order_by("product_id", "-score", "neighbor_id")
+                    .values_list("product_id", "neighbor_id", "score"))
+
+    def test_pending_neighbors_match_rebuild(self):
+        p0, p1, p2, p3 = (product.id for product in self.products[:4])
+        self.fill_cart(self.products[:3])
+        self.checkout("cle-a")
+        self.fill_cart(self.products[:2])
+        self.checkout("cle-b")
+        self.fill_cart([self.products[1], self.products[3]])
+        self.checkout("cle-c")
+
+        refresh_pending_neighbors()
+        incremental = self.neighbors()
+        rebuild_recommendations()
+
+        self.assertEqual(incremental, self.neighbors())
+        self.assertIn((p0, p1, 2), incremental)
+        self.assertIn((p1, p3, 1), incremental)
+        self.assertNotIn((p2, p3, 1), incremental)
+        self.assertEqual(refresh_pending_neighbors(), (0, 0))
+
+    def test_single_product_orders_are_not_queued(self):
+        p0 = self.products[0].id
+        queue_neighbor_updates([p0, p0])
+        self.assertEqual(refresh_pending_neighbors(), (0, 0))
+
+    def test_product_page_shows_neighbors(self):
+        ProductNeighbor.objects.create(product=self.products[0], neighbor=self.products[5], score=3)
+        Product.objects.filter(pk=self.products[6].pk).update(is_active=False)
+        ProductNeighbor.objects.create(product=self.products[0], neighbor=self.products[6], score=4)
+
+        response = self.client.get(reverse("products_app:product_detail", args=[self.products[0].id]))
+
+        self.assertEqual(list(response.context["recommendations"]), [self.products[5]])
+
+
+# 🔹 Panier : fusion à la connexion
+class CartMergeTests(ShopTestCase):
+    def login_with_anonymous_cart(self, *products):
+        self.client.logout()
+        for product in products:
+            self.client.get(reverse("products_app:add_to_cart", args=[product.id]))
+        self.assertTrue(self.client.login(username="client", password="motdepasse"))
+        return dict(CartItem.objects.filter(cart__user=self.user).values_list("product_id", "quantity"))
+
+    def test_anonymous_cart_is_added_to_the_database_cart(self):
+        first, second = self.products[:2]
+        self.fill_cart([first])
+
+        quantities = self.login_with_anonymous_cart(first, second, second)
+
+        self.assertEqual(quantities, {first.id: 2, second.id: 2})
+
+    def test_merge_creates_the_database_cart(self):
+        quantities = self.login_with_anonymous_cart(self.products[0])
+        self.assertEqual(quantities, {self.products[0].id: 1})
+
+    def test_inactive_products_are_dropped_and_merge_happens_once(self):
+        first, second = self.products[:2]
+        Product.objects.filter(pk=second.pk).update(is_active=False)
+
+        self.login_with_anonymous_cart(first, second)
+        # Panier anonyme vidé : une nouvelle connexion n'ajoute rien
+        quantities = self.login_with_anonymous_cart()
+
+        self.assertEqual(quantities, {first.id: 1})
+
+
+# 🔹 Panier : stores
+class CartStoreTests(ShopTestCase):
+    """Même scénario pour chaque store ; cookies et session passent d'une requête à la suivante."""
+
+    def setUp(self):
+        super().setUp()
+        self.cookies, self.session = {}, {}
+
+    def make_request(self, user=None):
+        request = RequestFactory().get("/")
+        request.COOKIES.update(self.cookies)
+        request.session = self.session
+        request.user = user or AnonymousUser()
+        return request
+
+    def send(self, store):
+        response = HttpResponse()
+        store.persist(response)
+        for name, morsel in response.cookies.items():
+            if morsel.value:
+                self.cookies[name] = morsel.value
+            else:
+                self.cookies.pop(name, None)
+
+    def assert_store_behaviour(self, store_class, user=None):
+        first, second = (str(product.id) for product in self.products[:2])
+        store = store_class(self.make_request(user))
+        self.assertEqual(store.items(), {})
+        self.assertEqual(store.add(first), 1)
+        self.assertEqual(store.add(first, 2), 3)
+        self.assertEqual(store.add(second), 1)
+        self.assertEqual(store.add(second, -1), 0)
+        self.assertEqual(store.add(second, -1), 0)
+        self.send(store)
+
+        store = store_class(self.make_request(user))
+        self.assertEqual(store.items(), {first: 3})
+        store.add(second, 2)
+        store.remove(first)
+        self.assertEqual(store.items(), {second: 2})
+        self.send(store)
+
+        store = store_class(self.make_request(user))
+        self.assertEqual(store.items(), {second: 2})
+        store.clear()
+        self.send(store)
+        self.assertEqual(store_class(self.make_request(user)).items(), {})
+
+    def test_session_store(self):
+        self.assert_store_behaviour(SessionCartStore)
+
+    def test_signed_cookie_store(self):
+        self.assert_store_behaviour(SignedCookieCartStore)
+        self.assertNotIn(SignedCookieCartStore.COOKIE_NAME, self.cookies)
+
+    def test_tampered_cookie_is_an_empty_cart(self):
+        self.cookies[SignedCookieCartStore.COOKIE_NAME] = '{"1":5}'
+        self.assertEqual(SignedCookieCartStore(self.make_request()).items(), {})
+
+    def test_cache_store(self):
+        self.assert_store_behaviour(CacheCartStore)
+
+    def test_cache_store_tabs_do_not_lose_updates(self):
+        first, second = (str(product.id) for product in self.products[:2])
+        store = CacheCartStore(self.make_request())
+        store.add(first)
+        self.send(store)
+        # Deux onglets chargés avec le même panier, qui ajoutent chacun avant de relire
+        tab_a, tab_b = CacheCartStore(self.make_request()), CacheCartStore(self.make_request())
+        tab_a.add(first)
+        tab_b.add(first)
+        tab_a.add(second)
+        tab_b.add(self.products[2].id)
+        self.assertEqual(CacheCartStore(self.make_request()).items(), {first: 3, second: 1, str(self.products[2].id): 1})
+
+    def test_database_store(self):
+        self.assert_store_behaviour(DatabaseCartStore, user=self.user)
+        self.assertFalse(CartItem.objects.exists())
+
+    def test_cache_store_requires_atomic_backend(self):
+        with override_settings(CART_STORE="cache"):
+            with self.assertRaises(ImproperlyConfigured):
+                check_cart_store_backend()
+        memcached = {"default": {"BACKEND": "django.core.cache.backends.memcached.PyMemcacheCache"}}
+        with override_settings(CART_STORE="cache", CACHES=memcached):
+            check_cart_store_backend()
+        with override_settings(CART_STORE="session"):
+            check_cart_store_backend()
+
+
+# 🔹 Vues asynchrones (ASGI)
+class AsyncViewTests(ShopTestCase):
+    """Les vues tournent dans une boucle d'événements ; aucune lecture du cache ni écriture SQLite n'y a lieu."""
+
+    def run_on_loop(self, view, request):
+        """Exécute `view` ; retourne `(réponse, thread de la boucle, threads ayant lu le cache)`."""
+        readers, loop_thread = set(), []
+        original_get = LocMemCache.get
+
+        def spy_get(backend, *args, **kwargs):
+            readers.add(threading.get_ident())
+            return original_get(backend, *args, **kwargs)
+
+        async def call():
+            loop_thread.append(threading.get_ident())
+            return await view(request)
+
+        with mock.patch.object(LocMemCache, "get", spy_get):
+            response = async_to_sync(call)()
+        return response, loop_thread[0], readers
+
+    def test_search_reads_the_catalog_version_off_the_loop(self):
+        product_index.build()
+        response, loop_thread, readers = self.run_on_loop(
+            search_products, RequestFactory().get(reverse("products_app:search"), {"q": "produit 1"}),
+        )
+        self.assertIn("Produit 1", [doc["name"] for doc in json.loads(response.content)["results"]])
+        self.assertTrue(readers)
+        self.assertNotIn(loop_thread, readers)
+
+    def test_geo_tree_reads_its_version_off_the_loop(self):
+        get_tree()
+        response, loop_thread, readers = self.run_on_loop(ajax_geo_tree, RequestFactory().get("/"))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(readers)
+        self.assertNotIn(loop_thread, readers)
+
+    @override_settings(METRICS_FLUSH_INTERVAL=0)
+    def test_metrics_are_flushed_off_the_loop(self):
+        async def view(request):
+            return HttpResponse()
+
+        flushers = []
+        with mock.patch.object(recorder, "flush", side_effect=lambda: flushers.append(threading.get_ident())):
+            response, loop_thread, _ = self.run_on_loop(MetricsMiddleware(view), RequestFactory().get("/"))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(flushers)
+        self.assertNotIn(loop_thread, flushers)
+
+
+# 🔹 Routage base principale / réplique
+@override_settings(**TEST_SETTINGS)
+class ReplicaRoutingTests(TransactionTestCase):
+    """Deux alias déclarés ; on relève le choix du routeur pour `Product` sans ouvrir la réplique.
+
+    TransactionTestCase : sous TestCase, tout tourne dans une transaction sur la base
+    principale et le routeur n'enverrait jamais rien vers la réplique.
+    """
+
+    def setUp(self):
+        self.addCleanup(_pinned.reset, _pinned.set(False))
+        self.product = Product.objects.create(name="Tapis", price=Decimal("1500.00"))
+        self.reads = []
+        self.geo_reads = []
+        route = PrimaryReplicaRouter.db_for_read
+
+        def spy(router, model, **hints):
+            alias = route(router, model, **hints)
+            if model is Product:
+                self.reads.append(alias)
+            elif model in (Wilaya, Daira, Commune):
+                self.geo_reads.append(alias)
+            return DEFAULT_DB_ALIAS
+
+        patches = [
+            mock.patch.dict(settings.DATABASES, {REPLICA_DB_ALIAS: settings.DATABASES[DEFAULT_DB_ALIAS]}),
+            mock.patch.object(PrimaryReplicaRouter, "db_for_read", spy),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        # La création du produit a épinglé le test sur la base principale : on repart de la réplique
+        _pinned.set(False)
+
+    def test_catalog_reads_go_to_replica(self):
+        Product.objects.get(pk=self.product.pk)
+        self.assertEqual(self.reads, [REPLICA_DB_ALIAS])
+
+    def test_write_pins_following_reads_to_primary(self):
+        Product.objects.filter(pk=self.product.pk).update(price=Decimal("1400.00"))
+        Product.objects.get(pk=self.product.pk)
+        self.assertEqual(self.reads, [DEFAULT_DB_ALIAS])
+
+    def test_cache_filling_renders_read_from_primary(self):
+        cache.clear()
+        url = reverse("products_app:product_detail", args=[self.product.id])
+
+        self.client.get(url)
+        self.assertTrue(self.reads)
+        self.assertEqual(set(self.reads), {DEFAULT_DB_ALIAS})
+
+        # Page servie depuis le cache : aucune lecture
+        self.reads.clear()
+        self.client.get(url)
+        self.assertEqual(self.reads, [])
+
+    def test_search_index_is_built_from_primary(self):
+        ProductSearchIndex().build()
+        self.assertNotIn(REPLICA_DB_ALIAS, self.reads)
+
+    def test_geo_tree_is_loaded_from_primary(self):
+        oran = Wilaya.objects.create(name="Oran")
+        _pinned.set(False)
+        tree = GeoTree.from_db()
+        self.assertEqual(tree.wilayas[oran.id], "Oran")
+        self.assertNotIn(REPLICA_DB_ALIAS, self.geo_reads)
+
+    def test_checkout_reads_prices_on_primary(self):
+        user = User.objects.create_user(username="client", password="motdepasse")
+        cart = Cart.objects.create(user=user)
+        CartItem.objects.create(cart=cart, product=self.product, quantity=2)
+        self.client.force_login(user)
+        self.reads.clear()
+
+        response = self.client.get(reverse("products_app:checkout"))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(self.reads)
+        self.assertEqual(set(self.reads), {DEFAULT_DB_ALIAS})
+
+
+# 🔹 Connexions persistantes (CONN_HEALTH_CHECKS avant Django 4.1)
+class ConnectionHealthCheckTests(SimpleTestCase):
+    def fake_connection(self, usable=True, health_checks=True, max_age=60, opened=True):
+        connection = mock.Mock(in_atomic_block=False, settings_dict={
+            "CONN_MAX_AGE": max_age, "CONN_HEALTH_CHECKS": health_checks,
+        })
+        connection.connection = object() if opened else None
+        connection.is_usable.return_value = usable
+        return connection
+
+    def check(self, *fakes):
+        with mock.patch.object(connections, "all", return_value=list(fakes)):
+            check_persistent_connections()
+
+    def test_dead_connection_is_closed(self):
+        dead, alive = self.fake_connection(usable=False), self.fake_connection()
+        self.check(dead, alive)
+        dead.close.assert_called_once_with()
+        alive.close.assert_not_called()
+
+    def test_database_error_during_ping_closes_the_connection(self):
+        broken = self.fake_connection()
+        broken.is_usable.side_effect = DatabaseError("server closed the connection")
+        self.check(broken)
+        broken.close.assert_called_once_with()
+
+    def test_unchecked_connections_are_not_pinged(self):
+        fakes = [
+            self.fake_connection(usable=False, health_checks=False),
+            self.fake_connection(usable=False, max_age=0),
+            self.fake_connection(usable=False, opened=False),
+        ]
+        self.check(*fakes)
+        for fake in fakes:
+            fake.is_usable.assert_not_called()
+            fake.close.assert_not_called()
@@ -6,6 +6,7 @@ app_name = "products_app"
 urlpatterns = [
     # Pages publiques
     path("", views.home, name="home"),
+    path("api/products/", views.home_products, name="home_products"),
     path("cart/", views.cart_view, name="cart"),
     path("add-to-cart/<int:product_id>/", views.add_to_cart, name="add_to_cart"),
     path("decrease-qty/<int:product_id>/", views.decrease_qty, name="decrease_qty"),
@@ -14,6 +15,7 @@ urlpatterns = [
     path("buy-now/<int:product_id>/", views.buy_now, name="buy_now"),
     path("checkout/", views.checkout, name="checkout"),
     path('order-success/<int:order_id>/', views.order_success, name='order_success'),
+    path("ajax/geo/", views.ajax_geo_tree, name="ajax_geo_tree"),
     path("ajax/load-dairas/", views.ajax_load_dairas, name="ajax_load_dairas"),
     path("ajax/load-communes/", views.ajax_load_communes, name="ajax_load_communes"),
     path('orders/', views.order_history, name='order_history'),
@@ -21,6 +23,8 @@ urlpatterns = [
     # Admin : gestion des commandes
     path('admin/orders/', views.admin_orders, name='admin_orders'),
     path('admin/export_orders_csv/', views.export_order_csv, name='export_orders_csv'),
+    path('admin/sales/', views.sales_dashboard, name='sales_dashboard'),
+    path('metrics/', views.metrics, name='metrics'),
     path('products/<int:pk>/', views.product_detail, name='product_detail'),
     path('search/', views.search_products, name='search'),
 
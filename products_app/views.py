@@ -3,146 +3,176 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib import messages
 from django.contrib.admin.views.decorators import staff_member_required
+from django.core.paginator import Paginator
 from django.http import JsonResponse, HttpResponse
+from django.template.loader import render_to_string
 from django.urls import reverse
-from .models import Product, Order, OrderItem, Daira, Commune
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import quote_etag, urlencode
+from asgiref.sync import sync_to_async
+from myshop.routers import pin_to_primary
+from .models import Product, Order
 from .forms import CheckoutForm
-import csv
+from .cart import CartService, get_cart_store
+from .cache import cache_anonymous_page, get_catalog_version
+from .orders import find_order, place_order
+from .search import product_index
+from .geo import geo_version, get_tree, loaded_tree
+from .exports import export_response
+from .board import FILTER_PARAMS, board_page, status_counts
+from .metrics import recorder
+from .sales import DASHBOARD_PERIODS, dashboard, dashboard_period
+from .recommendations import recommended_products
+import uuid
 from django.contrib.auth.decorators import login_required
 
 
 # 🏠 Pages publiques
 #------------------------------------------------------------------------------------------------------------------
 
+CATALOG_PAGE_SIZE = 12
+ORDER_HISTORY_PAGE_SIZE = 10
+GEO_CACHE_SECONDS = 60 * 60 * 24
+
+
+def _catalog_page(request):
+    """Page du catalogue paginée par curseur (keyset) sur `id`.
+
+    `?after=<id>` donne la page suivante sans OFFSET : le coût d'une page ne
+    dépend pas de sa position dans le catalogue. Les images ne sont préchargées
+    que pour les cartes absentes du cache de fragments (voir `product_cards`).
+    """
+    try:
+        after = int(request.GET.get("after", 0))
+    except (ValueError, TypeError):
+        after = 0
+    products = Product.objects.filter(is_active=True, id__gt=after).order_by("id")
+    page = list(products[:CATALOG_PAGE_SIZE + 1])
+    next_cursor = page[CATALOG_PAGE_SIZE - 1].id if len(page) > CATALOG_PAGE_SIZE else None
+    return page[:CATALOG_PAGE_SIZE], next_cursor
+
+
+@cache_anonymous_page
 def home(request):
-    products = Product.objects.filter(is_active=True)
-    return render(request, "products_app/home.html", {"products": products})
+    products, next_cursor = _catalog_page(request)
+    return render(request, "products_app/home.html", {"products": products, "next_cursor": next_cursor})
+
 
+def home_products(request):
+    products, next_cursor = _catalog_page(request)
+    html = render_to_string("products_app/_product_cards.html", {"products": products}, request=request)
+    next_url = f"{reverse('products_app:home_products')}?after={next_cursor}" if next_cursor else None
+    return JsonResponse({"html": html, "next_url": next_url})
 
+
+@cache_anonymous_page
 def product_detail(request, pk):
-    product = get_object_or_404(Product, id=pk)
-    return render(request, 'products_app/product_detail.html', {'product': product})
+    product = get_object_or_404(Product.objects.prefetch_related('images'), id=pk)
+    # Voisins précalculés (products_app.recommendations) : une lecture indexée + un in_bulk
+    context = {'product': product, 'recommendations': recommended_products(product.id)}
+    return render(request, 'products_app/product_detail.html', context)
 
 
-def search_products(request):
+async def search_products(request):
     query = request.GET.get('q', '').strip()
     results = []
     if query:
-        products = Product.objects.filter(name__icontains=query)[:10]
-        for product in products:
+        # Index déjà en mémoire : seule la version du catalogue (cache) est lue hors de la
+        # boucle ; sinon la construction (ORM) passe par le thread de l'ORM
+        docs = None
+        if product_index.is_built():
+            version = await sync_to_async(get_catalog_version, thread_sensitive=False)()
+            docs = product_index.search_if_ready(query, version, limit=10)
+        if docs is None:
+            docs = await sync_to_async(product_index.search)(query, limit=10)
+        for doc in docs:
             results.append({
-                'id': product.id,
-                'name': product.name,
-                'price': product.price,
-                'image_url': product.image.url if product.image else '',
+                'id': doc['id'],
+                'name': doc['name'],
+                'price': doc['price'],
+                'image_url': doc['image_url'],
             })
     return JsonResponse({'results': results})
 
 
+def _prune_cart(request, cart):
+    if cart.prune():
+        messages.warning(request, "Certains produits de votre panier ne sont plus disponibles et ont été retirés.")
+
+
 def cart_view(request):
-    cart = request.session.get("cart", {})
-    products = []
-    total = 0
-    for product_id, qty in cart.items():
-        product = get_object_or_404(Product, id=product_id)
-        subtotal = product.price * qty
-        products.append({"product": product, "qty": qty, "subtotal": subtotal})
-        total += subtotal
-    context = {"cart_items": products, "total": total}
-    return render(request, "products_app/cart.html", context)
+    cart = CartService(request)
+    _prune_cart(request, cart)
+    return render(request, "products_app/cart.html", cart.context())
 
 
 def add_to_cart(request, product_id):
-    cart = request.session.get("cart", {})
-    cart[str(product_id)] = cart.get(str(product_id), 0) + 1
-    request.session["cart"] = cart
+    get_cart_store(request).add(product_id)
     messages.success(request, "Produit ajouté au panier.")
     return redirect(request.META.get('HTTP_REFERER', 'products_app:home'))
 
 
 def decrease_qty(request, product_id):
-    cart = request.session.get("cart", {})
-    if str(product_id) in cart:
-        if cart[str(product_id)] > 1:
-            cart[str(product_id)] -= 1
-        else:
-            del cart[str(product_id)]
-    request.session["cart"] = cart
+    get_cart_store(request).add(product_id, -1)
     return redirect("products_app:cart")
 
 
 def remove_from_cart(request, product_id):
-    cart = request.session.get("cart", {})
-    if str(product_id) in cart:
-        del cart[str(product_id)]
-    request.session["cart"] = cart
+    get_cart_store(request).remove(product_id)
     return redirect("products_app:cart")
 
 
 def clear_cart(request):
-    request.session["cart"] = {}
+    get_cart_store(request).clear()
     return redirect("products_app:cart")
 
 
 def buy_now(request, product_id):
     product = get_object_or_404(Product, id=product_id)
-    cart = request.session.get("cart", {})
-    cart[str(product_id)] = cart.get(str(product_id), 0) + 1
-    request.session["cart"] = cart
+    get_cart_store(request).add(product_id)
     messages.success(request, f"{product.name} a été ajouté au panier pour achat ✅")
     return redirect("products_app:cart")
 
 
+def _order_placed_response(request, order):
+    get_cart_store(request).clear()
+    redirect_url = reverse('products_app:order_success', args=[order.id])
+    if request.headers.get('x-requested-with') == 'XMLHttpRequest':
+        return JsonResponse({'success': True, 'redirect': redirect_url})
+    messages.success(request, "Votre commande a été confirmée !")
+    return redirect(redirect_url)
+
+
 @login_required
 def checkout(request):
-    cart = request.session.get("cart", {})
+    # Prix et disponibilité lus sur la base principale : ce sont eux qui seront facturés
+    pin_to_primary()
+    if request.method == "POST":
+        # Soumission rejouée : la commande existe déjà, même si le panier a été vidé
+        idempotency_key = request.headers.get('Idempotency-Key') or request.POST.get('idempotency_key')
+        existing = find_order(request.user, idempotency_key)
+        if existing is not None:
+            return _order_placed_response(request, existing)
+    cart = CartService(request)
+    _prune_cart(request, cart)
     if not cart:
         messages.error(request, "Votre panier est vide.")
         return redirect("products_app:cart")
     if request.method == "POST":
         form = CheckoutForm(request.POST)
         if form.is_valid():
-            order = Order.objects.create(
-                user=request.user,
-                full_name=form.cleaned_data['full_name'],
-                email=form.cleaned_data['email'],
-                phone=form.cleaned_data['phone'],
-                wilaya=form.cleaned_data['wilaya'],
-                daira=form.cleaned_data['daira'],
-                commune=form.cleaned_data['commune'],
-                address_details=form.cleaned_data['address_details'],
-            )
-            for product_id, qty in cart.items():
-                product = get_object_or_404(Product, id=product_id)
-                OrderItem.objects.create(
-                    order=order,
-                    product=product,
-                    quantity=qty,
-                    price=product.price
-                )
-            request.session["cart"] = {}
-            redirect_url = reverse('products_app:order_success', args=[order.id])
-            if request.headers.get('x-requested-with') == 'XMLHttpRequest':
-                return JsonResponse({'success': True, 'redirect': redirect_url})
-            else:
-                messages.success(request, "Votre commande a été confirmée !")
-                return redirect(redirect_url)
+            order, _ = place_order(request.user, cart, form.cleaned_data, idempotency_key)
+            return _order_placed_response(request, order)
         else:
             if request.headers.get('x-requested-with') == 'XMLHttpRequest':
                 return JsonResponse({'success': False, 'errors': form.errors})
     else:
         form = CheckoutForm(initial={
             'full_name': request.user.get_full_name(),
-            'email': request.user.email
+            'email': request.user.email,
+            'idempotency_key': uuid.uuid4().hex,
         })
-    cart_items = []
-    total = 0
-    for product_id, qty in cart.items():
-        product = get_object_or_404(Product, id=product_id)
-        subtotal = product.price * qty
-        cart_items.append({"product": product, "qty": qty, "subtotal": subtotal})
-        total += subtotal
-    context = {"form": form, "cart_items": cart_items, "total": total}
+    context = {"form": form, **cart.context()}
     return render(request, "products_app/checkout.html", context)
 
 
@@ -154,20 +184,56 @@ def order_success(request, order_id):
 
 @login_required
 def order_history(request):
-    orders = Order.objects.filter(user=request.user).order_by('-created_at')
-    return render(request, 'products_app/order_history.html', {'orders': orders})
+    # Total et nombre d'articles lus sur la commande (tenus à jour par products_app.orders) ;
+    # lignes et produits préchargés pour la seule page affichée : nombre de requêtes constant.
+    orders = Order.objects.filter(user=request.user).prefetch_related(
+        'items__product'
+    ).order_by('-created_at', '-id')
+    page = Paginator(orders, ORDER_HISTORY_PAGE_SIZE).get_page(request.GET.get('page'))
+    return render(request, 'products_app/order_history.html', {'orders': page})
+
+
+def _geo_param(request, name):
+    try:
+        return int(request.GET.get(name))
+    except (ValueError, TypeError):
+        return None
+
+
+async def _aget_tree():
+    # Version partagée (cache) lue hors de la boucle ; l'arbre du worker est servi depuis la mémoire
+    tree = loaded_tree(await sync_to_async(geo_version, thread_sensitive=False)())
+    if tree is None:
+        tree = await sync_to_async(get_tree)()
+    return tree
+
+
+def _geo_response(request, tree, build_response):
+    """Réponse cachable : ETag = version de l'arbre, 304 si le client l'a déjà."""
+    etag = quote_etag(tree.version)
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = build_response()
+    response.headers['ETag'] = etag
+    patch_cache_control(response, public=True, max_age=GEO_CACHE_SECONDS)
+    return response
 
 
-def ajax_load_dairas(request):
-    wilaya_id = request.GET.get("wilaya_id")
-    dairas = Daira.objects.filter(wilaya_id=wilaya_id).values("id", "name")
-    return JsonResponse(list(dairas), safe=False)
+async def ajax_geo_tree(request):
+    tree = await _aget_tree()
+    return _geo_response(request, tree, lambda: HttpResponse(tree.json, content_type="application/json"))
 
 
-def ajax_load_communes(request):
-    daira_id = request.GET.get("daira_id")
-    communes = Commune.objects.filter(daira_id=daira_id).values("id", "name")
-    return JsonResponse(list(communes), safe=False)
+async def ajax_load_dairas(request):
+    tree = await _aget_tree()
+    wilaya_id = _geo_param(request, "wilaya_id")
+    return _geo_response(request, tree, lambda: JsonResponse(tree.dairas_of(wilaya_id), safe=False))
+
+
+async def ajax_load_communes(request):
+    tree = await _aget_tree()
+    daira_id = _geo_param(request, "daira_id")
+    return _geo_response(request, tree, lambda: JsonResponse(tree.communes_of(daira_id), safe=False))
 
 
 # 🛠️ Pages admin
@@ -175,20 +241,41 @@ def ajax_load_communes(request):
 
 @staff_member_required
 def admin_orders(request):
-    orders = Order.objects.all().order_by('-created_at')
-    return render(request, 'products_app/admin_orders.html', {'orders': orders})
+    orders, next_cursor = board_page(request.GET)
+    filters = {name: request.GET.get(name, '') for name in FILTER_PARAMS}
+    active_filters = {name: value for name, value in filters.items() if value}
+    counts = status_counts(request.GET)
+    context = {
+        'orders': orders,
+        'filters': filters,
+        'filter_query': urlencode(active_filters),
+        'status_base_query': urlencode({k: v for k, v in active_filters.items() if k != 'status'}),
+        'next_query': urlencode({**active_filters, 'after': next_cursor}) if next_cursor else None,
+        'is_first_page': 'after' not in request.GET,
+        'status_counts': [(code, label, counts[code]) for code, label in Order.STATUS_CHOICES],
+        'total_count': counts['total'],
+        'status_choices': Order.STATUS_CHOICES,
+        'wilaya_choices': get_tree().wilaya_choices(),
+    }
+    return render(request, 'products_app/admin_orders.html', context)
 
 
 @staff_member_required
 def export_order_csv(request):
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = 'attachment; filename="orders.csv"'
-    writer = csv.writer(response)
-    writer.writerow(['Order ID', 'User', 'Status', 'Total Amount', 'Created At'])
-    orders = Order.objects.all()
-    for order in orders:
-        writer.writerow([order.id, order.user.username, order.status, order.total_amount, order.created_at])
-    return response
+    return export_response(request)
+
+
+@staff_member_required
+def sales_dashboard(request):
+    # Lit uniquement les agrégats journaliers (products_app.sales), jamais les commandes
+    context = dashboard(dashboard_period(request.GET))
+    context['periods'] = DASHBOARD_PERIODS
+    return render(request, 'products_app/sales_dashboard.html', context)
+
+
+@staff_member_required
+def metrics(request):
+    return HttpResponse(recorder.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
 
 
 @staff_member_required